@@ -0,0 +1,399 @@
+# Разбор потока Apertium
+
+# Строка потока состоит из лексических единиц вида ^основа<тег><тег>$,
+# между которыми стоят пробелы и знаки препинания.
+# пример:
+# ^the<det><def><sp>$ ^text<n><sg>$^.<sent>$
+# ^банк<n><nom>+е<cop><aor><p3><sg>$ ^*аналитиктер$
+
+# tokenize разбирает строку за один проход и возвращает лексические единицы:
+# кортежи (основа, теги одной строкой, как в таблицах, кортеж отдельных
+# тегов, флаги). Правила разбора те же, что были в
+# struct_rules_via_table.py:
+# - кавычки ' и " из строки удаляются;
+# - единицы, в которых встречается "sent" (знаки препинания <sent>), и
+#   единицы без тегов (например, неизвестные слова *аналитиктер)
+#   пропускаются переводчиком (флаги SENT и NO_TAGS);
+# - теги - всё, начиная с первого '<', включая '$' и склеенные через '+'
+#   разборы (<n><nom>+е<cop><aor><p3><sg>$, флаг JOINED);
+# - основа неизвестного слова остается со '*' (флаг UNKNOWN).
+# Символы, экранированные обратной косой чертой (\^, \$, \<, ...), не
+# считаются разделителями, а из основы слова экранирование убирается.
+
+# Строка делится по '^' одним вызовом split (на C), а каждая единица
+# разбирается только при первой встрече: единицы (текст между '^') и их
+# теги повторяются в тексте очень часто, поэтому готовые единицы
+# запоминаются (не больше UNIT_MEMO_SIZE) и для повторов берутся из
+# словаря. Одинаковые строки тегов при этом - один и тот же объект.
+
+# split_line возвращает то, что нужно переводчику: списки основ и тегов
+# единиц, которые он переводит (собираются из tokenize).
+
+# Ввод и вывод потока большими блоками:
+# open_input - читает байты кусками по READ_CHUNK_SIZE, декодирует UTF-8 по
+# мере чтения и делит текст на строки;
+# open_output - копит вывод в буфере и записывает его большими блоками (или
+# после каждой строки в построчном режиме).
+# read_null_blocks - для режима null-flush (-z, как в Apertium): читает блоки
+# текста, каждый из которых заканчивается символом '\0'.
+# Деление на строки, декодирование и буферизация делаются модулем io (на C),
+# а не циклом на Python: так поток обрабатывается быстрее, чем через
+# sys.stdin и sys.stdout с буферами по 8 КБ.
+
+# ==========
+# imports
+# ==========
+
+import io
+import re
+
+# ==========
+# constants
+# ==========
+
+# поля лексической единицы:
+# основа слова
+LEMMA = 0
+# теги одной строкой, как в таблицах (<n><nom>+е<cop><aor><p3><sg>$)
+MORPH = 1
+# кортеж отдельных тегов ("<n>", "<nom>", "+е", "<cop>", ...)
+TAGS = 2
+# флаги (UNKNOWN, JOINED, ...)
+FLAGS = 3
+
+# флаги лексической единицы
+# основа начинается с '*' - слово неизвестно анализатору
+UNKNOWN = 1
+# разбор склеен из нескольких через '+'
+JOINED = 2
+# в единице есть экранированные символы
+ESCAPED = 4
+# в единице встречается "sent" (знаки препинания <sent>)
+SENT = 8
+# у единицы нет тегов
+NO_TAGS = 16
+
+# флаги единиц, которые переводчик пропускает
+SKIPPED = SENT | NO_TAGS
+
+# размер куска при чтении и блока при записи (в байтах)
+READ_CHUNK_SIZE = 1 << 20
+WRITE_BLOCK_SIZE = 1 << 20
+
+# символ конца блока в режиме null-flush
+NULL_FLUSH = '\0'
+
+# наибольшее число запомненных единиц (и отдельно строк тегов)
+# при переполнении запомненное сбрасывается
+UNIT_MEMO_SIZE = 1 << 14
+
+# отдельные теги и склеенные через '+' части разбора
+TAG_RE = re.compile(r"<[^<>]*>|\+[^<$]*")
+
+# экранированный символ
+ESCAPE_RE = re.compile(r"\\(.)", re.S)
+# пробельные символы, кроме самого пробела
+# (по ним перевод из словаря делится на несколько слов при выводе)
+NON_SPACE_WHITESPACE_RE = re.compile(r"[^\S ]+")
+
+# запомненные единицы: текст единицы между '^' -> лексическая единица
+# (None - пустая единица)
+unit_memo = {}
+# запомненные теги: теги единицы с пробелами после них -> (теги без
+# пробелов, кортеж отдельных тегов, флаги тегов)
+morph_memo = {}
+
+# ==========
+# functions
+# ==========
+
+
+def remove_quotes(line: str) -> str:
+    """
+    Функция удаляет из строки кавычки ' и ".
+    Может быть не нужно... Скорее всего не нужно.
+    """
+    if '\'' in line:
+        line = line.replace('\'', '')
+    if '\"' in line:
+        line = line.replace('\"', '')
+    return line
+
+
+def output_form(word: str):
+    """
+    Функция возвращает основу слова в том виде, в котором она выводится:
+    саму строку (с пробелами, как в словаре), если при выводе это ровно
+    одно слово, иначе кортеж слов (пустая основа пропадает, основа с
+    табуляцией и другими пробельными символами, кроме пробела, делится на
+    части).
+    пример: "ие бол" -> "ие бол", "a\\tb" -> ("a", "b"), "" -> ()
+    """
+    if not word or NON_SPACE_WHITESPACE_RE.search(word):
+        return tuple(part for part in NON_SPACE_WHITESPACE_RE.split(word)
+                     if part)
+    return word
+
+
+def split_escaped(line: str) -> list:
+    """
+    Функция делит строку с экранированными символами по символам '^',
+    которые не экранированы.
+    """
+    segments = []
+    start = 0
+    pos = 0
+    while pos < len(line):
+        char = line[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if char == '^':
+            segments.append(line[start:pos])
+            start = pos + 1
+        pos += 1
+    segments.append(line[start:])
+    return segments
+
+
+def find_tags_escaped(item: str) -> int:
+    """
+    Функция ищет первый не экранированный символ '<' в единице.
+    Возвращает его индекс или -1.
+    """
+    pos = 0
+    while pos < len(item):
+        char = item[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if char == '<':
+            return pos
+        pos += 1
+    return -1
+
+
+def split_tags(morph: str) -> tuple:
+    """
+    Функция делит строку тегов на отдельные теги.
+    Склеенные через '+' части разбора остаются отдельными элементами.
+    пример: <n><nom>+е<cop><aor>$ -> ("<n>", "<nom>", "+е", "<cop>", "<aor>")
+    """
+    return tuple(TAG_RE.findall(morph))
+
+
+def morph_info(tail: str) -> tuple:
+    """
+    Функция разбирает теги единицы и запоминает результат.
+    Возвращает (теги без пробелов в конце, кортеж отдельных тегов, флаги).
+    Параметры:
+        tail: str - часть единицы, начиная с первого '<'
+    """
+    morph = tail.rstrip()
+    flags = SENT if "sent" in morph else 0
+    if '+' in morph:
+        flags |= JOINED
+    info = morph_memo[tail] = (morph, split_tags(morph), flags)
+    return info
+
+
+def untagged_unit(lemma: str, flags: int) -> tuple:
+    """
+    Функция создает лексическую единицу без тегов: убирает '$' в конце
+    основы (если он не экранирован).
+    пример: *аналитиктер$ -> ("*аналитиктер", "", (), UNKNOWN | NO_TAGS)
+    """
+    if lemma.endswith('$') and not lemma.endswith('\\$'):
+        lemma = lemma[:-1]
+    return (lemma, "", (), flags | NO_TAGS)
+
+
+def make_unit(item: str) -> tuple:
+    """
+    Функция разбирает одну единицу (текст между '^' без экранированных
+    символов) и запоминает результат.
+    Возвращает лексическую единицу или None, если единица пустая.
+    """
+    tag_idx = item.find('<')
+    if tag_idx < 0:
+        lemma = item.strip()
+        unit = None
+        if lemma:
+            flags = SENT if "sent" in lemma else 0
+            if lemma.startswith('*'):
+                flags |= UNKNOWN
+            unit = untagged_unit(lemma, flags)
+    else:
+        # пробелы по краям единицы убираются только с основы и тегов,
+        # без копии всей единицы
+        tail = item[tag_idx:]
+        morph, tags, flags = morph_memo.get(tail) or morph_info(tail)
+        lemma = item[:tag_idx].lstrip()
+        if "sent" in lemma:
+            flags |= SENT
+        if lemma.startswith('*'):
+            flags |= UNKNOWN
+        unit = (lemma, morph, tags, flags)
+    unit_memo[item] = unit
+    return unit
+
+
+def tokenize(line: str) -> list:
+    """
+    Функция разбирает строку потока за один проход.
+    Возвращает список лексических единиц (основа, теги, кортеж тегов,
+    флаги) всех непустых единиц строки, включая те, что переводчик
+    пропускает (их можно отличить по флагам SENT и NO_TAGS).
+    Единицы запоминаются и отдаются всем строкам, где они встречаются,
+    поэтому изменять их нельзя.
+    пример: ^the<det><def><sp>$ ^*gambler$ ->
+            [("the", "<det><def><sp>$", ("<det>", "<def>", "<sp>"), 0),
+             ("*gambler", "", (), UNKNOWN | NO_TAGS)]
+    """
+    line = remove_quotes(line)
+    if '\\' in line:
+        return escaped_units(line)
+
+    if len(unit_memo) >= UNIT_MEMO_SIZE:
+        unit_memo.clear()
+    if len(morph_memo) >= UNIT_MEMO_SIZE:
+        morph_memo.clear()
+    get = unit_memo.get
+    units = []
+    # разбиваем строку по символу '^' (сам он при этом пропадает)
+    for item in line.split('^'):
+        unit = get(item, False)
+        if unit is False:
+            unit = make_unit(item)
+        if unit is not None:
+            units.append(unit)
+    return units
+
+
+def split_line(line: str) -> tuple:
+    """
+    Функция разбирает строку потока (см. tokenize).
+    Возвращает (список основ слов, список тегов слов) для единиц, которые
+    переводит переводчик (без <sent> и без единиц без тегов).
+    пример: ^the<det><def><sp>$ ^text<n><sg>$^.<sent>$ ->
+            (["the", "text"], ["<det><def><sp>$", "<n><sg>$"])
+    """
+    words = []
+    tags = []
+    for lemma, morph, _, flags in tokenize(line):
+        if not flags & SKIPPED:
+            words.append(lemma)
+            tags.append(morph)
+    return words, tags
+
+
+def escaped_units(line: str) -> list:
+    """
+    Функция разбирает строку с экранированными символами (см. tokenize).
+    Такие строки редки, поэтому единицы не запоминаются.
+    """
+    units = []
+    for item in split_escaped(line):
+        item = item.strip()
+        if not item:
+            continue
+        flags = ESCAPED if '\\' in item else 0
+        if "sent" in item:
+            flags |= SENT
+        if item.startswith('*'):
+            flags |= UNKNOWN
+        tag_idx = find_tags_escaped(item)
+        if tag_idx < 0:
+            unit = untagged_unit(item, flags)
+        else:
+            morph = item[tag_idx:]
+            if '+' in morph:
+                flags |= JOINED
+            unit = (item[:tag_idx], morph, split_tags(morph), flags)
+        if flags & ESCAPED:
+            unit = (ESCAPE_RE.sub(r"\1", unit[LEMMA]),) + unit[MORPH:]
+        units.append(unit)
+    return units
+
+
+def raw_stream(stream, mode: str):
+    """
+    Функция возвращает небуферизованный поток для дескриптора файла двоичного
+    потока (например, sys.stdin.buffer). Дескриптор при закрытии нового
+    потока не закрывается. Если у потока нет дескриптора (например,
+    io.BytesIO), возвращается сам поток.
+    Параметры:
+        stream - двоичный поток
+        mode: str - "rb" или "wb"
+    """
+    try:
+        fd = stream.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return stream
+    return io.FileIO(fd, mode, closefd=False)
+
+
+def open_input(stream, chunk_size: int = READ_CHUNK_SIZE) -> io.TextIOWrapper:
+    """
+    Функция открывает двоичный поток для чтения строк большими кусками.
+    Символы, разрезанные границей куска, декодируются вместе со следующим
+    куском. Строки делятся только по \\n и не перекодируются: '\\r' перед
+    \\n остается в строке и убирается при её разборе (split_line), а
+    одиночный '\\r' переводом строки не считается.
+    Строки, уже пришедшие по медленному каналу, читаются сразу, не дожидаясь
+    заполнения куска.
+    Параметры:
+        stream - двоичный поток (например, sys.stdin.buffer)
+        chunk_size: int - размер куска чтения в байтах
+    """
+    reader = io.BufferedReader(raw_stream(stream, "rb"), chunk_size)
+    return io.TextIOWrapper(reader, encoding="utf-8", newline="\n")
+
+
+def open_output(stream, block_size: int = WRITE_BLOCK_SIZE,
+                line_flush: bool = False) -> io.TextIOWrapper:
+    """
+    Функция открывает двоичный поток для записи строк большими блоками.
+    Параметры:
+        stream - двоичный поток (например, sys.stdout.buffer)
+        block_size: int - размер блока записи в байтах
+        line_flush: bool - записывать и сбрасывать поток после каждой
+                           строки (для интерактивной работы)
+    """
+    if hasattr(stream, "flush"):
+        # то, что уже лежит в буфере исходного потока, пишется первым
+        stream.flush()
+    writer = io.BufferedWriter(raw_stream(stream, "wb"), block_size)
+    return io.TextIOWrapper(writer, encoding="utf-8",
+                            line_buffering=line_flush)
+
+
+def read_null_blocks(stream, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Функция-генератор: читает двоичный поток в режиме null-flush и
+    возвращает блоки текста без завершающего '\\0', декодированные из
+    UTF-8 (переводы строк не перекодируются, как в open_input).
+    Блок возвращается, как только пришел его '\\0', не дожидаясь
+    следующих данных. Текст после последнего '\\0' тоже считается блоком.
+    Параметры:
+        stream - двоичный поток (например, sys.stdin.buffer)
+        chunk_size: int - наибольший размер одного чтения в байтах
+    """
+    # небуферизованное чтение возвращает то, что уже пришло
+    read = raw_stream(stream, "rb").read
+    pending = bytearray()
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            break
+        # '\0' не встречается внутри многобайтовых символов UTF-8
+        end = chunk.rfind(b"\0")
+        if end < 0:
+            pending += chunk
+            continue
+        pending += chunk[:end]
+        for block in bytes(pending).split(b"\0"):
+            yield block.decode("utf-8")
+        pending = bytearray(chunk[end + 1:])
+    if pending:
+        yield bytes(pending).decode("utf-8")
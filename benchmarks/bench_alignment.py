@@ -0,0 +1,122 @@
+# Сравнение выравнивания слов:
+# - прежнее: для каждой пары тегов цепочка сравнений compare_tags и
+#   list.index() (скопировано сюда для сравнения)
+# - по классам эквивалентности тегов (rule_index.build_alignment,
+#   tag_classes.py)
+
+# Замеряется:
+# - построение карт выравнивания для всех правил таблицы (при загрузке);
+# - выравнивание всех групп тегов входных корпусов (так выравнивались
+#   группы во время перевода до карт выравнивания; сейчас так
+#   выравниваются группы, которых нет в таблице).
+
+# запуск:
+# python benchmarks/bench_alignment.py [-r 20]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from golden import CORPORA, read_corpus  # noqa: E402
+from rule_index import (build_alignment, compare_tags,  # noqa: E402
+                        get_first_tag)
+from struct_rules_via_table import (Translator, get_tables,  # noqa: E402
+                                    get_tag_classes, parse_line)
+
+# ==========
+# functions
+# ==========
+
+
+def legacy_alignment(source_tags: list, target_tags: list) -> tuple:
+    """
+    Прежнее выравнивание слов группы (через compare_tags).
+    """
+    alignment = []
+    for tar_tags in target_tags:
+        for sour_tags in source_tags:
+            if compare_tags(get_first_tag(tar_tags),
+                            get_first_tag(sour_tags)):
+                alignment.append(source_tags.index(sour_tags))
+                break
+    return tuple(alignment)
+
+
+def corpus_groups(direction: str) -> list:
+    """
+    Функция делит строки входного корпуса на группы тегов.
+    Возвращает список пар (теги слов группы, теги целевого языка).
+    """
+    translator = Translator(direction)
+    pairs = []
+    for line in read_corpus(direction):
+        _, source_tags = parse_line(line)
+        groups = translator.tag_trie.match_rules(
+            translator.tag_trie.vocab.encode(source_tags))
+        for (start, end, _), target_list in zip(
+                groups, translator.transform_groups(groups)):
+            pairs.append((' '.join(source_tags[start:end]).split(),
+                          target_list))
+    return pairs
+
+
+def best_time(align, pairs: list, repeat: int) -> float:
+    """
+    Функция выравнивает все пары repeat раз и возвращает лучшее время
+    одного прохода в секундах.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for source_tags, target_tags in pairs:
+            align(source_tags, target_tags)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Сравнение выравнивания слов")
+    parser.add_argument("-r", "--repeat", type=int, default=20,
+                        help="сколько раз повторить замер")
+    args = parser.parse_args()
+
+    for direction in CORPORA:
+        tag_classes = get_tag_classes(direction)
+
+        def align(source_tags, target_tags):
+            return build_alignment(source_tags, target_tags, tag_classes)
+
+        source_table, target_table = get_tables(direction)
+        rules = [(source_morph.split(), target_morph.split())
+                 for source_morph, target_morph in zip(source_table,
+                                                       target_table)]
+        groups = corpus_groups(direction)
+        for name, pairs in [("правила таблицы", rules),
+                            ("группы корпуса", groups)]:
+            # результаты должны совпадать
+            assert all(legacy_alignment(*pair) == align(*pair)
+                       for pair in pairs)
+            legacy = best_time(legacy_alignment, pairs, args.repeat)
+            classes = best_time(align, pairs, args.repeat)
+            sys.stdout.write(
+                "%s, %-15s (%5d): compare_tags %7.2f мс, классы %7.2f мс "
+                "(x%.1f)\n" % (direction, name, len(pairs), legacy * 1000,
+                               classes * 1000, legacy / classes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Скорость перевода корпусов по всем четырем направлениям
+
+# Для каждого направления входной корпус (golden.CORPORA) повторяется
+# нужное число раз, переводится struct_rules_via_table.py в отдельном
+# процессе, и выводятся:
+# - скорость: строк/с и слов/с (без учета запуска);
+# - пиковая память процесса (RSS);
+# - время запуска (перевод пустого входа);
+# - совпадает ли перевод с эталоном results/*.txt (см. golden.py).
+# Если перевод хоть одного направления не совпал с эталоном, программа
+# завершается с кодом 1.
+
+# запуск:
+# python benchmarks/bench_corpora.py [-r 100 | -n 1000000] [-d eng-kaz]
+#                                    [-a "-b 1000 --cache-entries 10000"]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from apertium_stream import split_line  # noqa: E402
+from golden import (CORPORA, normalize_output, read_corpus,  # noqa: E402
+                    read_golden)
+
+# ==========
+# constants
+# ==========
+
+SCRIPT = os.path.join(BASE_DIR, "struct_rules_via_table.py")
+
+# сколько раз замерять время запуска (берется медиана)
+STARTUP_RUNS = 5
+
+# ==========
+# functions
+# ==========
+
+
+def run(args: list, input_path: str, output_path: str) -> tuple:
+    """
+    Функция запускает переводчик с файлами ввода и вывода.
+    Возвращает (время работы в секундах, пиковая память в КБ).
+    """
+    with open(input_path, "rb") as stdin, open(output_path, "wb") as stdout:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, SCRIPT] + args,
+                                   cwd=BASE_DIR, stdin=stdin, stdout=stdout)
+        # wait4 возвращает ресурсы, использованные именно этим процессом
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    return elapsed, usage.ru_maxrss
+
+
+def measure_startup(args: list, tmp_dir: str) -> float:
+    """
+    Функция возвращает медиану времени запуска переводчика (перевод
+    пустого входа) в секундах.
+    """
+    empty_path = os.path.join(tmp_dir, "empty.txt")
+    open(empty_path, "wb").close()
+    times = sorted(run(args, empty_path, os.devnull)[0]
+                   for _ in range(STARTUP_RUNS))
+    return times[len(times) // 2]
+
+
+def check_output(path: str, golden: list, replicate: int) -> tuple:
+    """
+    Функция сравнивает перевод повторенного корпуса с повторенным
+    эталоном.
+    Возвращает (количество несовпавших строк, номер первой из них или
+    None).
+    """
+    mismatches = 0
+    first = None
+    count = 0
+    with open(path, encoding="utf-8", newline='\n') as f:
+        for count, line in enumerate(f, 1):
+            if line.endswith('\n'):
+                line = line[:-1]
+            if normalize_output(line) != golden[(count - 1) % len(golden)]:
+                mismatches += 1
+                if first is None:
+                    first = count
+    # строк в выводе должно быть столько же, сколько в эталоне
+    expected = len(golden) * replicate
+    if count != expected:
+        mismatches += abs(expected - count)
+        if first is None:
+            first = min(count, expected) + 1
+    return mismatches, first
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Скорость перевода корпусов по всем направлениям")
+    parser.add_argument("-d", "--direction", action="append",
+                        choices=list(CORPORA),
+                        help="направление перевода (по умолчанию все)")
+    parser.add_argument("-r", "--replicate", type=int, default=100,
+                        help="сколько раз повторить корпус "
+                             "(по умолчанию 100)")
+    parser.add_argument("-n", "--lines", type=int,
+                        help="сколько строк переводить (корпус "
+                             "повторяется до этого числа строк; "
+                             "заменяет -r)")
+    parser.add_argument("-a", "--args", default="",
+                        help="дополнительные ключи переводчика, "
+                             "например \"-b 1000\"")
+    args = parser.parse_args()
+
+    extra_args = shlex.split(args.args)
+    failed = False
+    sys.stdout.write("%-8s %9s %11s %11s %9s %9s  %s\n" %
+                     ("", "строк", "строк/с", "слов/с", "RSS, МБ",
+                      "запуск", "эталон"))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for direction in args.direction or list(CORPORA):
+            corpus = read_corpus(direction)
+            golden = read_golden(direction)
+            replicate = args.replicate
+            if args.lines:
+                replicate = max(1, -(-args.lines // len(corpus)))
+            tokens = sum(len(split_line(line)[0]) for line in corpus)
+
+            input_path = os.path.join(tmp_dir, "input.txt")
+            output_path = os.path.join(tmp_dir, "output.txt")
+            block = ''.join(line + '\n' for line in corpus).encode("utf-8")
+            with open(input_path, "wb") as f:
+                for _ in range(replicate):
+                    f.write(block)
+
+            direction_args = ["-d", direction] + extra_args
+            startup = measure_startup(direction_args, tmp_dir)
+            elapsed, max_rss = run(direction_args, input_path, output_path)
+            work = max(elapsed - startup, 1e-9)
+            mismatches, first = check_output(output_path, golden, replicate)
+            if mismatches:
+                failed = True
+                check = "НЕ СОВПАДАЕТ (%d строк, первая - %d)" % (
+                    mismatches, first)
+            else:
+                check = "совпадает"
+
+            sys.stdout.write(
+                "%-8s %9d %11.0f %11.0f %9.1f %7.0f мс  %s\n" %
+                (direction, len(corpus) * replicate,
+                 len(corpus) * replicate / work, tokens * replicate / work,
+                 max_rss / 1024.0, startup * 1000, check))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Сравнение скорости ввода-вывода потока:
+# - построчное чтение sys.stdin и запись sys.stdout.write (как раньше)
+# - чтение большими кусками и запись большими блоками (apertium_stream.py)
+
+# Вход - data_eng_kaz/new100tags_eng.txt, повторенный до нужного размера.
+# Сами строки не переводятся, чтобы измерялся только ввод-вывод.
+
+# запуск:
+# python benchmarks/bench_io.py [-s 1024]   (размер входа в МБ)
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==========
+# constants
+# ==========
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(BASE_DIR, "data_eng_kaz", "new100tags_eng.txt")
+
+# построчный ввод-вывод
+LINE_IO = (
+    "import sys\n"
+    "for line in sys.stdin:\n"
+    "    sys.stdout.write(line)\n"
+)
+
+# ввод-вывод большими кусками
+CHUNKED_IO = (
+    "import sys\n"
+    "from apertium_stream import open_input, open_output\n"
+    "writer = open_output(sys.stdout.buffer)\n"
+    "for line in open_input(sys.stdin.buffer):\n"
+    "    writer.write(line)\n"
+    "writer.flush()\n"
+)
+
+# ==========
+# functions
+# ==========
+
+
+def make_input(path: str, size: int):
+    """
+    Функция записывает в файл корпус, повторенный до size байт.
+    """
+    with open(CORPUS, "rb") as f:
+        corpus = f.read()
+    block = corpus * max(1, (1 << 24) // len(corpus))
+    written = 0
+    with open(path, "wb") as f:
+        while written < size:
+            f.write(block)
+            written += len(block)
+
+
+def run(code: str, path: str) -> float:
+    """
+    Функция запускает код в новом процессе интерпретатора, подавая файл на
+    stdin. Возвращает время работы в секундах.
+    """
+    with open(path, "rb") as stdin:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR,
+                       stdin=stdin, stdout=subprocess.DEVNULL, check=True)
+        return time.perf_counter() - start
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Сравнение скорости ввода-вывода потока")
+    parser.add_argument("-s", "--size", type=int, default=64,
+                        help="размер входа в МБ (по умолчанию 64)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "input.txt")
+        make_input(path, args.size << 20)
+        size = os.path.getsize(path) / (1 << 20)
+        for name, code in [("построчно", LINE_IO),
+                           ("кусками", CHUNKED_IO)]:
+            elapsed = run(code, path)
+            sys.stdout.write("%-10s %7.1f МБ/с\n" % (name, size / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Сравнение словарей для перевода основ слов:
+# - dict - словарь в куче процесса (загрузка языковой пары и
+#   build_output_lexicon);
+# - hash, sorted - файлы, отображенные в память (mapped_lexicon.py).
+
+# Для каждого направления выводятся:
+# - время загрузки (для файлов - открытие уже собранного файла);
+# - время поиска одной основы по всем словам входного корпуса: через get
+#   (с запоминанием частых основ) и прямо в файле (find, без запоминания);
+# - размер файла.
+# Перед замером проверяется, что все три словаря дают одинаковые переводы,
+# в том числе table_translate (с заменой пробелов на '_').
+
+# запуск:
+# python benchmarks/bench_lexicon.py [-r 20]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from golden import CORPORA, read_corpus  # noqa: E402
+from lexicon_store import read_pair  # noqa: E402
+from mapped_lexicon import LEXICON_CLASSES, mapped_path  # noqa: E402
+from struct_rules_via_table import (DIRECTIONS,  # noqa: E402
+                                    build_lexicon, build_output_lexicon,
+                                    get_direction_lists, parse_line,
+                                    use_mapped_lexicon)
+
+# ==========
+# functions
+# ==========
+
+
+def load_dict(direction: str) -> dict:
+    """
+    Функция загружает языковую пару и строит словарь для вывода, как
+    переводчик без --mapped-lexicon.
+    """
+    pair, _, _, source_name, target_name = DIRECTIONS[direction]
+    data = read_pair(pair)
+    return build_output_lexicon(data[source_name], data[target_name])
+
+
+def best_time(function, repeat: int) -> float:
+    """
+    Функция вызывает function repeat раз и возвращает лучшее время одного
+    вызова в секундах.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def check_lexicons(direction: str, lexicons: dict):
+    """
+    Функция проверяет, что словари в файлах дают те же переводы, что и
+    словари в куче.
+    """
+    _, _, source_dic, target_dic = get_direction_lists(direction)
+    output_lexicon = build_output_lexicon(source_dic, target_dic)
+    lexicon = build_lexicon(source_dic, target_dic)
+    for mapped in lexicons.values():
+        assert len(mapped) == len(output_lexicon)
+        for source_word in list(output_lexicon) + ["", "unknown"]:
+            assert mapped.get(source_word) == \
+                output_lexicon.get(source_word)
+            assert mapped.get_escaped(source_word) == \
+                lexicon.get(source_word)
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Сравнение словарей в куче и в файлах mmap")
+    parser.add_argument("-r", "--repeat", type=int, default=20,
+                        help="сколько раз повторить замер")
+    args = parser.parse_args()
+
+    sys.stdout.write("%-8s %-7s %10s %13s %13s %9s\n" %
+                     ("", "", "загрузка", "get", "find", "файл"))
+    for direction in CORPORA:
+        lexicons = {layout: use_mapped_lexicon(direction, layout)
+                    for layout in LEXICON_CLASSES}
+        check_lexicons(direction, lexicons)
+        words = [source_word for line in read_corpus(direction)
+                 for source_word in parse_line(line)[0]]
+
+        output_lexicon = load_dict(direction)
+        load = best_time(lambda: load_dict(direction), args.repeat)
+        get = best_time(lambda: [output_lexicon.get(word) for word in words],
+                        args.repeat)
+        sys.stdout.write("%-8s %-7s %7.1f мс %10.0f нс %13s %9s\n" %
+                         (direction, "dict", load * 1000,
+                          get / len(words) * 1e9, "-", "-"))
+
+        for layout, lexicon_class in LEXICON_CLASSES.items():
+            path = mapped_path(direction, layout)
+            mapped = lexicon_class(path)
+            load = best_time(lambda: lexicon_class(path), args.repeat)
+            get = best_time(lambda: [mapped.get(word) for word in words],
+                            args.repeat)
+            find = best_time(lambda: [mapped.find(word) for word in words],
+                             args.repeat)
+            sys.stdout.write(
+                "%-8s %-7s %7.1f мс %10.0f нс %10.0f нс %6.0f КБ\n" %
+                (direction, layout, load * 1000, get / len(words) * 1e9,
+                 find / len(words) * 1e9, os.path.getsize(path) / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Подсчет окон (длин последовательностей тегов), проверяемых при делении
+# предложений на группы тегов, на входных корпусах.
+
+# Сравнивается поиск по префиксному дереву (rule_index.py), которое пробует
+# только те длины, что могут совпасть с правилом таблицы, со старым
+# перебором всех длин от 6 до 1.
+
+# Также выводится доля попаданий в запомненные деления на группы
+# (TagTrie.match_rules): для последовательностей тегов предложений целиком
+# и для окон, с которых начинаются группы.
+
+# запуск:
+# python benchmarks/bench_segmentation.py
+
+# ==========
+# imports
+# ==========
+
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from struct_rules_via_table import get_tag_trie, parse_line  # noqa: E402
+
+# ==========
+# constants
+# ==========
+
+# направление перевода -> входной корпус
+CORPORA = {
+    "eng-kaz": "data_eng_kaz/new100tags_eng.txt",
+    "kaz-eng": "data_eng_kaz/new100tags_kaz.txt",
+    "kaz-rus": "data_kaz_rus/trainwithtag100.kaz",
+    "rus-kaz": "data_kaz_rus/trainwithtag100.rus",
+}
+
+# ==========
+# functions
+# ==========
+
+
+def hit_rate(hits: int, misses: int) -> str:
+    """
+    Функция возвращает долю попаданий в виде строки.
+    """
+    total = hits + misses
+    return "%d из %d (%.1f%%)" % (hits, total,
+                                  100.0 * hits / total if total else 0.0)
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    for direction, corpus in CORPORA.items():
+        tag_trie = get_tag_trie(direction)
+        checked = 0
+        legacy = 0
+        with open(os.path.join(BASE_DIR, corpus), encoding="utf-8") as f:
+            for line in f:
+                _, source_tags = parse_line(line)
+                tag_ids = tag_trie.vocab.encode(source_tags)
+                line_checked, line_legacy = tag_trie.count_windows(tag_ids)
+                checked += line_checked
+                legacy += line_legacy
+                tag_trie.match_rules(tag_ids)
+        pruned = legacy - checked
+        sys.stdout.write(
+            "%s: макс. длина правила %d, окон проверено %d из %d, "
+            "отброшено %d (%.1f%%)\n" %
+            (direction, tag_trie.max_len, checked, legacy, pruned,
+             100.0 * pruned / legacy if legacy else 0.0))
+        stats = tag_trie.memo_stats()
+        sys.stdout.write(
+            "    запомненные деления: предложения %s, окна %s\n" %
+            (hit_rate(stats["sequence_hits"], stats["sequence_misses"]),
+             hit_rate(stats["window_hits"], stats["window_misses"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# Задержка перевода коротких предложений:
+# - новый процесс struct_rules_via_table.py на каждое предложение
+# - сервер перевода (translation_server.py) через Unix-сокет (null-flush)
+# - сервер перевода по HTTP
+
+# Предложения берутся из data_eng_kaz/new100tags_eng.txt (самые короткие).
+
+# запуск:
+# python benchmarks/bench_server.py [-n 1000]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==========
+# constants
+# ==========
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(BASE_DIR, "data_eng_kaz", "new100tags_eng.txt")
+DIRECTION = "eng-kaz"
+HTTP_PORT = 8766
+
+# сколько раз запускать новый процесс (это долго)
+SPAWN_RUNS = 20
+
+# ==========
+# functions
+# ==========
+
+
+def percentiles(latencies: list) -> str:
+    """
+    Функция возвращает p50 и p99 задержек в миллисекундах.
+    """
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return "p50 %8.3f мс, p99 %8.3f мс" % (p50 * 1000, p99 * 1000)
+
+
+def bench_spawn(sentences: list) -> list:
+    """
+    Функция переводит каждое предложение новым процессом.
+    """
+    latencies = []
+    for sentence in sentences[:SPAWN_RUNS]:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "struct_rules_via_table.py",
+                        "-d", DIRECTION], cwd=BASE_DIR,
+                       input=sentence.encode("utf-8"),
+                       stdout=subprocess.DEVNULL, check=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_socket(socket_path: str, sentences: list) -> list:
+    """
+    Функция переводит предложения по одному через Unix-сокет.
+    """
+    latencies = []
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        for sentence in sentences:
+            start = time.perf_counter()
+            client.sendall(sentence.encode("utf-8") + b"\0")
+            response = b""
+            while not response.endswith(b"\0"):
+                response += client.recv(1 << 16)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_http(sentences: list) -> list:
+    """
+    Функция переводит предложения по одному по HTTP (одно подключение).
+    """
+    latencies = []
+    connection = http.client.HTTPConnection("127.0.0.1", HTTP_PORT)
+    path = "/translate?direction=" + DIRECTION
+    for sentence in sentences:
+        start = time.perf_counter()
+        connection.request("POST", path, sentence.encode("utf-8"))
+        connection.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies
+
+
+def wait_for_server(socket_path: str):
+    """
+    Функция ждет, пока сервер начнет принимать подключения.
+    """
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+            with socket.create_connection(("127.0.0.1", HTTP_PORT)):
+                return
+        except OSError:
+            time.sleep(0.05)
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Задержка перевода коротких предложений")
+    parser.add_argument("-n", "--requests", type=int, default=1000,
+                        help="сколько запросов отправить серверу")
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = sorted(f.readlines(), key=len)[:100]
+    sentences = [corpus[i % len(corpus)] for i in range(args.requests)]
+
+    sys.stdout.write("новый процесс: %s\n" %
+                     percentiles(bench_spawn(sentences)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "server.sock")
+        server = subprocess.Popen(
+            [sys.executable, "translation_server.py", "-d", DIRECTION,
+             "--socket", socket_path, "--port", str(HTTP_PORT)],
+            cwd=BASE_DIR, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_server(socket_path)
+            sys.stdout.write("Unix-сокет:    %s\n" %
+                             percentiles(bench_socket(socket_path,
+                                                      sentences)))
+            sys.stdout.write("HTTP:          %s\n" %
+                             percentiles(bench_http(sentences)))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
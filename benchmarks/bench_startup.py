@@ -0,0 +1,143 @@
+# Сравнение времени старта:
+# - импорт исходных модулей словарей и таблиц без кэша байт-кода (.pyc
+#   нет и не пишется - так бывает только при первом запуске после
+#   изменения модулей или в каталоге без прав на запись);
+# - импорт исходных модулей с готовым кэшем байт-кода (обычный запуск);
+# - загрузка скомпилированных бинарных файлов (lexicon_store.py).
+
+# Кэш байт-кода каждый раз берется в отдельном временном каталоге
+# (PYTHONPYCACHEPREFIX), так что __pycache__ в каталоге проекта на
+# результат не влияет; для варианта с готовым кэшем он заполняется одним
+# запуском заранее.
+# Каждый вариант запускается в отдельном процессе интерпретатора,
+# выводятся медиана и минимум по нескольким запускам: время всего процесса
+# и время самой загрузки (замеряется внутри процесса).
+# Во всех вариантах (и в пустом запуске) до замера импортируются модули,
+# которые переводчик импортирует в любом случае (argparse и другие модули
+# стандартной библиотеки, которые использует lexicon_store.py), чтобы
+# замерялась только загрузка словарей и таблиц.
+
+# запуск:
+# python benchmarks/bench_startup.py [-n 10]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==========
+# constants
+# ==========
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# код, который замеряет загрузку и выводит её время в секундах
+TIMED = (
+    "import argparse, importlib, marshal, time\n"
+    "start = time.perf_counter()\n"
+    "%s\n"
+    "print(time.perf_counter() - start)"
+)
+
+# пустой запуск интерпретатора - базовая линия
+BASELINE = "pass"
+
+# импорт исходных модулей
+IMPORT_SOURCES = (
+    "import tables_eng_kaz, tables_kaz_rus, eng_kaz_dic, kaz_rus_dic"
+)
+
+# загрузка скомпилированных файлов
+LOAD_COMPILED = (
+    "import lexicon_store\n"
+    "lexicon_store.load_pair('eng_kaz')\n"
+    "lexicon_store.load_pair('kaz_rus')"
+)
+
+# ==========
+# functions
+# ==========
+
+
+def run_once(code: str, env: dict) -> tuple:
+    """
+    Функция запускает код в новом процессе интерпретатора.
+    Возвращает (время работы процесса, время загрузки) в секундах.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", TIMED % code],
+                            cwd=BASE_DIR, env=env, check=True,
+                            stdout=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    return elapsed, float(result.stdout)
+
+
+def measure(code: str, env: dict, repeat: int) -> tuple:
+    """
+    Функция запускает код repeat раз.
+    Возвращает (список времен процесса, список времен загрузки).
+    """
+    runs = [run_once(code, env) for _ in range(repeat)]
+    return [run[0] for run in runs], [run[1] for run in runs]
+
+
+def make_env(pycache_dir: str, write_bytecode: bool) -> dict:
+    """
+    Функция возвращает окружение процесса с кэшем байт-кода в
+    pycache_dir; если write_bytecode ложно, байт-код не пишется.
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_dir)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if not write_bytecode:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Сравнение времени старта")
+    parser.add_argument("-n", "--repeat", type=int, default=10,
+                        help="количество запусков каждого варианта")
+    args = parser.parse_args()
+
+    # сначала собираем бинарные файлы, чтобы сравнение было честным
+    subprocess.run([sys.executable, "lexicon_store.py"], cwd=BASE_DIR,
+                   check=True, stdout=subprocess.DEVNULL)
+
+    with tempfile.TemporaryDirectory() as cold_dir, \
+            tempfile.TemporaryDirectory() as warm_dir:
+        cold = make_env(cold_dir, write_bytecode=False)
+        warm = make_env(warm_dir, write_bytecode=True)
+        # заполняем кэш байт-кода для варианта с готовым кэшем
+        run_once(IMPORT_SOURCES, warm)
+        run_once(LOAD_COMPILED, warm)
+
+        variants = [("интерпретатор", BASELINE, warm),
+                    ("импорт .py без .pyc", IMPORT_SOURCES, cold),
+                    ("импорт .py с .pyc", IMPORT_SOURCES, warm),
+                    ("бинарные файлы", LOAD_COMPILED, warm)]
+        sys.stdout.write("%-20s %21s %21s\n" %
+                         ("", "процесс (мед./мин.)", "загрузка (мед./мин.)"))
+        for name, code, env in variants:
+            process_times, load_times = measure(code, env, args.repeat)
+            sys.stdout.write(
+                "%-20s %7.1f / %7.1f мс %7.1f / %7.1f мс\n" %
+                (name, statistics.median(process_times) * 1000,
+                 min(process_times) * 1000,
+                 statistics.median(load_times) * 1000,
+                 min(load_times) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# Сравнение разбора строк потока Apertium:
+# - прежний разбор из struct_rules_via_table.py (несколько проходов по
+#   строке, скопирован сюда для сравнения)
+# - apertium_stream.tokenize (лексические единицы с кортежем тегов и
+#   флагами)
+# - apertium_stream.split_line (то, что получает переводчик; собирается
+#   из tokenize)
+
+# tokenize запоминает разобранные единицы, поэтому скорость выводится
+# отдельно:
+# - для первого прохода по корпусам (запомненное сброшено; в корпусах по
+#   100 строк повторяется примерно половина единиц);
+# - для повторных проходов (корпуса повторены -r раз, все единицы уже
+#   разобраны) - так работает переводчик на длинном входе или сервер.
+# Пиковая память (вместе с временными объектами) на одну единицу
+# замеряется на повторном проходе.
+
+# запуск:
+# python benchmarks/bench_tokenizer.py [-r 20] [-n 5]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from apertium_stream import (morph_memo, split_line,  # noqa: E402
+                             tokenize, unit_memo)
+
+# ==========
+# constants
+# ==========
+
+CORPORA = [
+    "data_eng_kaz/new100tags_eng.txt",
+    "data_eng_kaz/new100tags_kaz.txt",
+    "data_kaz_rus/trainwithtag100.kaz",
+    "data_kaz_rus/trainwithtag100.rus",
+]
+
+# ==========
+# functions
+# ==========
+
+
+def legacy_parse_line(line: str) -> tuple:
+    """
+    Прежний разбор строки (до apertium_stream.py).
+    """
+    if '\'' in line:
+        line = line.replace('\'', '')
+    if '\"' in line:
+        line = line.replace('\"', '')
+    splitted_input_str = line.split('^')
+
+    source_words_with_tags = []
+    for item in splitted_input_str:
+        if item != "" and "sent" not in item:
+            source_words_with_tags.append(item.strip())
+
+    source_words = []
+    source_tags = []
+    for item in source_words_with_tags:
+        if '<' in item:
+            tag_idx = item.index('<')
+        else:
+            continue
+
+        source_words.append(item[:tag_idx])
+        source_tags.append(item[tag_idx:])
+
+    return source_words, source_tags
+
+
+def clear_memo():
+    """
+    Функция сбрасывает запомненные единицы и теги.
+    """
+    unit_memo.clear()
+    morph_memo.clear()
+
+
+def best_pass(parse, lines: list, repeat: int, cold: bool) -> float:
+    """
+    Функция разбирает все строки repeat раз и возвращает лучшее время
+    одного прохода в секундах. Если cold истинно, перед каждым проходом
+    запомненное сбрасывается.
+    """
+    best = None
+    for _ in range(repeat):
+        if cold:
+            clear_memo()
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(parse, lines: list) -> int:
+    """
+    Функция считает суммарную пиковую память (в байтах), занятую при
+    разборе каждой строки, включая временные объекты.
+    """
+    total = 0
+    tracemalloc.start()
+    for line in lines:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = parse(line)
+        total += tracemalloc.get_traced_memory()[1] - before
+        del result
+    tracemalloc.stop()
+    return total
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Сравнение разбора строк потока Apertium")
+    parser.add_argument("-r", "--replicate", type=int, default=20,
+                        help="сколько раз повторить корпуса")
+    parser.add_argument("-n", "--repeat", type=int, default=5,
+                        help="сколько раз повторить замер")
+    args = parser.parse_args()
+
+    lines = []
+    for corpus in CORPORA:
+        with open(os.path.join(BASE_DIR, corpus), encoding="utf-8") as f:
+            lines.extend(f.readlines())
+    units = sum(line.count('^') for line in lines)
+
+    variants = [("прежний разбор", legacy_parse_line),
+                ("tokenize", tokenize),
+                ("split_line", split_line)]
+    sys.stdout.write("%-16s %19s %19s %14s\n" %
+                     ("", "первый проход", "повторы", "память"))
+    for name, parse in variants:
+        cold = best_pass(parse, lines, args.repeat, True)
+        warm = best_pass(parse, lines * args.replicate, args.repeat, False)
+        memory = peak_memory(parse, lines)
+        sys.stdout.write(
+            "%-16s %10.0f единиц/с %10.0f единиц/с %5.0f байт/ед.\n" %
+            (name, units / cold, units * args.replicate / warm,
+             memory / units))
+
+
+if __name__ == "__main__":
+    main()
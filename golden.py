@@ -0,0 +1,211 @@
+# Эталонные переводы корпусов (results/*.txt)
+
+# В results/ лежат переводы входных корпусов по всем направлениям, сделанные
+# первой версией программы. Они записаны в старом формате:
+# - в начале строки номер: "1: текст<n><nom>$ ..."
+# - перед словами нет '^';
+# - пробелы внутри перевода и тегов заменены на '_' (unknown_word,
+#   <unknown_tags>).
+# Поэтому перед сравнением и эталон, и вывод переводчика приводятся к
+# общему виду: номер строки убирается, символы '^' удаляются, '_'
+# заменяется на пробел.
+
+# Запуск как программы - проверка регрессий: корпуса переводятся (при
+# необходимости повторенные -r раз), вывод сравнивается с эталоном
+# построчно в нескольких процессах, и для каждой несовпавшей строки
+# выводится первое несовпавшее слово.
+
+# запуск:
+# python golden.py [-d eng-kaz] [-r 100] [-j 4]
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+from itertools import islice
+
+from struct_rules_via_table import (PARALLEL_CHUNK_SIZE, Translator,
+                                    translate_in_batches)
+
+# ==========
+# constants
+# ==========
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# направление перевода -> (входной корпус, эталонный перевод)
+CORPORA = {
+    "eng-kaz": ("data_eng_kaz/new100tags_eng.txt", "results/eng-kaz.txt"),
+    "kaz-eng": ("data_eng_kaz/new100tags_kaz.txt", "results/kaz-eng.txt"),
+    "kaz-rus": ("data_kaz_rus/trainwithtag100.kaz", "results/kaz-rus.txt"),
+    "rus-kaz": ("data_kaz_rus/trainwithtag100.rus", "results/rus-kaz.txt"),
+}
+
+# номер строки в начале строки эталона
+LINE_NUMBER_RE = re.compile(r"^\d+: ")
+
+# сколько строк сравнивать в процессе-обработчике за раз
+DIFF_CHUNK_SIZE = 2000
+
+# сколько несовпавших строк выводить для одного направления
+MAX_REPORTED = 20
+
+# ==========
+# functions
+# ==========
+
+
+def normalize_output(line: str) -> str:
+    """
+    Функция приводит строку перевода к виду для сравнения с эталоном.
+    пример: ^unknown word<unknown tags> -> unknown word<unknown tags>
+    """
+    return line.replace('^', '').replace('_', ' ')
+
+
+def read_lines(path: str) -> list:
+    """
+    Функция читает файл и возвращает его строки без символов '\\n'
+    (строки делятся только по '\\n', как в выводе переводчика).
+    """
+    with open(os.path.join(BASE_DIR, path), encoding="utf-8",
+              newline='\n') as f:
+        lines = f.read().split('\n')
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def read_corpus(direction: str) -> list:
+    """
+    Функция возвращает строки входного корпуса направления перевода.
+    """
+    return read_lines(CORPORA[direction][0])
+
+
+def read_golden(direction: str) -> list:
+    """
+    Функция возвращает строки эталонного перевода направления перевода,
+    приведенные к виду для сравнения (normalize_output).
+    """
+    return [normalize_output(LINE_NUMBER_RE.sub('', line))
+            for line in read_lines(CORPORA[direction][1])]
+
+
+def first_divergence(output: str, expected: str) -> tuple:
+    """
+    Функция ищет первое несовпавшее слово в строке перевода (слова
+    делятся пробелом; обе строки приведены к виду для сравнения).
+    Возвращает (номер слова, слово перевода, слово эталона); если одна
+    строка короче, вместо недостающего слова - None.
+    """
+    output_tokens = output.split(' ')
+    expected_tokens = expected.split(' ')
+    for idx, (got, want) in enumerate(zip(output_tokens, expected_tokens)):
+        if got != want:
+            return idx, got, want
+    idx = min(len(output_tokens), len(expected_tokens))
+    return (idx,
+            output_tokens[idx] if idx < len(output_tokens) else None,
+            expected_tokens[idx] if idx < len(expected_tokens) else None)
+
+
+def diff_chunk(chunk: tuple) -> list:
+    """
+    Функция сравнивает пачку строк перевода с эталоном (в
+    процессе-обработчике).
+    Возвращает список несовпадений: (номер строки, номер слова, слово
+    перевода, слово эталона).
+    Параметры:
+        chunk: tuple - (номер первой строки, строки перевода, строки
+                       эталона)
+    """
+    start, outputs, expected = chunk
+    divergences = []
+    for line_no, (output, want) in enumerate(zip(outputs, expected), start):
+        output = normalize_output(output)
+        if output != want:
+            divergences.append((line_no,) + first_divergence(output, want))
+    return divergences
+
+
+def iter_diff_chunks(outputs, golden: list, line_count: int):
+    """
+    Функция-генератор: делит переводы на пачки по DIFF_CHUNK_SIZE строк
+    вместе с соответствующими строками повторенного эталона.
+    """
+    outputs = iter(outputs)
+    start = 0
+    while start < line_count:
+        chunk = list(islice(outputs, DIFF_CHUNK_SIZE))
+        expected = [golden[idx % len(golden)]
+                    for idx in range(start, start + len(chunk))]
+        yield start + 1, chunk, expected
+        start += len(chunk)
+
+
+def check_direction(direction: str, replicate: int, pool) -> tuple:
+    """
+    Функция переводит корпус направления, повторенный replicate раз, и
+    сравнивает перевод с эталоном в процессах пула.
+    Возвращает (количество строк, список несовпадений (diff_chunk)).
+    """
+    corpus = read_corpus(direction)
+    golden = read_golden(direction)
+    translator = Translator(direction)
+    lines = (line for _ in range(replicate) for line in corpus)
+    outputs = translate_in_batches(translator, lines, PARALLEL_CHUNK_SIZE)
+    line_count = len(corpus) * replicate
+    divergences = []
+    for chunk_divergences in pool.imap(
+            diff_chunk, iter_diff_chunks(outputs, golden, line_count)):
+        divergences.extend(chunk_divergences)
+    return line_count, divergences
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Проверка перевода корпусов по эталонам results/*.txt")
+    parser.add_argument("-d", "--direction", action="append",
+                        choices=list(CORPORA),
+                        help="направление перевода (по умолчанию все)")
+    parser.add_argument("-r", "--replicate", type=int, default=1,
+                        help="сколько раз повторить корпус (по умолчанию "
+                             "1)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=os.cpu_count() or 1,
+                        help="количество процессов для сравнения "
+                             "(по умолчанию - по числу процессоров)")
+    args = parser.parse_args()
+
+    failed = False
+    with multiprocessing.Pool(args.jobs) as pool:
+        for direction in args.direction or list(CORPORA):
+            line_count, divergences = check_direction(
+                direction, args.replicate, pool)
+            if not divergences:
+                sys.stdout.write("%s: %d строк, совпадает\n" %
+                                 (direction, line_count))
+                continue
+            failed = True
+            sys.stdout.write("%s: %d строк, не совпадает %d\n" %
+                             (direction, line_count, len(divergences)))
+            for line_no, idx, got, want in divergences[:MAX_REPORTED]:
+                sys.stdout.write("  строка %d, слово %d: получено %r, "
+                                 "ожидалось %r\n" %
+                                 (line_no, idx + 1, got, want))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Предкомпилированное хранилище словарей и таблиц структурных преобразований
+
+# Файлы eng_kaz_dic.py и kaz_rus_dic.py - это огромные списки-литералы.
+# Без кэша байт-кода (.pyc) они при запуске заново разбираются и
+# компилируются интерпретатором (сотни миллисекунд), а с кэшем их импорт
+# все равно создает каждую строку отдельным объектом из байт-кода. Здесь они
+# вместе с таблицами tables_eng_kaz.py и tables_kaz_rus.py компилируются в
+# бинарный файл (по одному на языковую пару), в котором каждый список лежит
+# одной строкой, разделенной символами '\0'; при загрузке она делится на
+# строки одним вызовом str.split (на C), что быстрее и импорта с готовым
+# .pyc (см. benchmarks/bench_startup.py).
+
+# сборка:
+# python lexicon_store.py
+# или для одной пары:
+# python lexicon_store.py eng_kaz
+
+# Если бинарный файл отсутствует или старее исходных модулей, загрузчик
+# молча импортирует исходные модули, как раньше.
+
+# При сборке для таблиц структурных преобразований (в обе стороны)
+# выводится, сколько в них скрытых правил - повторов строки входных тегов,
+# которые никогда не применяются (см. rule_index.RuleIndex). Сами правила
+# выводятся с ключом --show-rules:
+# python lexicon_store.py --show-rules kaz_rus
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import importlib
+import marshal
+import os
+import sys
+
+from rule_index import RuleIndex
+
+# ==========
+# constants
+# ==========
+
+# каталог с модулями словарей и таблиц
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# каталог для скомпилированных файлов
+COMPILED_DIR = os.path.join(BASE_DIR, "compiled")
+
+# сигнатура и версия формата бинарного файла
+MAGIC = b"SRVT"
+FORMAT_VERSION = 2
+
+# разделитель строк списка в бинарном файле
+SEPARATOR = '\0'
+
+# языковые пары: модуль -> имена списков, которые в нем лежат
+PAIRS = {
+    "eng_kaz": {
+        "tables_eng_kaz": ["eng_tags_4_eng_kaz", "kaz_tags_4_eng_kaz"],
+        "eng_kaz_dic": ["eng_4_eng_kaz", "kaz_4_eng_kaz"],
+    },
+    "kaz_rus": {
+        "tables_kaz_rus": ["kaz_tags_4_kaz_rus", "rus_tags_4_kaz_rus"],
+        "kaz_rus_dic": ["kaz_4_kaz_rus", "rus_4_kaz_rus"],
+    },
+}
+
+# ==========
+# functions
+# ==========
+
+
+def compiled_path(pair: str) -> str:
+    """
+    Функция возвращает путь к бинарному файлу для языковой пары.
+    пример: eng_kaz -> compiled/eng_kaz.bin
+    """
+    return os.path.join(COMPILED_DIR, pair + ".bin")
+
+
+def source_paths(pair: str) -> list:
+    """
+    Функция возвращает пути к исходным модулям языковой пары.
+    """
+    if pair not in PAIRS:
+        raise ValueError("Неизвестная языковая пара: " + pair)
+    return [os.path.join(BASE_DIR, module + ".py") for module in PAIRS[pair]]
+
+
+def is_fresh(pair: str, path: str = None) -> bool:
+    """
+    Функция проверяет, что бинарный файл существует и не старее исходных
+    модулей языковой пары.
+    Параметры:
+        pair: str - языковая пара
+        path: str - путь к файлу (по умолчанию compiled_path(pair))
+    """
+    path = path or compiled_path(pair)
+    if not os.path.exists(path):
+        return False
+    compiled_mtime = os.stat(path).st_mtime_ns
+    for source in source_paths(pair):
+        if os.stat(source).st_mtime_ns > compiled_mtime:
+            return False
+    return True
+
+
+def import_pair(pair: str) -> dict:
+    """
+    Функция импортирует исходные модули языковой пары.
+    Возвращает словарь: имя списка -> кортеж строк.
+    """
+    if pair not in PAIRS:
+        raise ValueError("Неизвестная языковая пара: " + pair)
+    data = {}
+    for module_name, names in PAIRS[pair].items():
+        module = importlib.import_module(module_name)
+        for name in names:
+            data[name] = tuple(getattr(module, name))
+    return data
+
+
+def build_pair(pair: str) -> str:
+    """
+    Функция компилирует словари и таблицы языковой пары в бинарный файл.
+    Каждый список записывается как (длина списка, строки списка через
+    SEPARATOR).
+    Возвращает путь к созданному файлу.
+    Если в строках списков встречается SEPARATOR, выбрасывает ValueError.
+    """
+    data = {}
+    for name, strings in import_pair(pair).items():
+        text = SEPARATOR.join(strings)
+        if text.count(SEPARATOR) != max(len(strings) - 1, 0):
+            raise ValueError("Символ \\0 в списке " + name)
+        data[name] = (len(strings), text)
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+    path = compiled_path(pair)
+    # пишем во временный файл и переименовываем, чтобы параллельно
+    # работающие процессы не прочитали недописанный файл
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(bytes([FORMAT_VERSION]))
+        f.write(marshal.dumps(data))
+    os.replace(tmp_path, path)
+    return path
+
+
+def report_rules(pair: str, data: dict, show_rules: bool = False) -> str:
+    """
+    Функция собирает отчет о скрытых правилах таблиц структурных
+    преобразований языковой пары в обе стороны.
+    Параметры:
+        pair: str - языковая пара
+        data: dict - списки языковой пары (import_pair)
+        show_rules: bool - перечислить сами скрытые правила
+    """
+    first_name, second_name = PAIRS[pair]["tables_" + pair]
+    report = []
+    for source_name, target_name in [(first_name, second_name),
+                                     (second_name, first_name)]:
+        rule_index = RuleIndex(data[source_name], data[target_name])
+        report.append("%s -> %s: правил %d, различных %d, скрытых %d "
+                      "(с другими выходными тегами %d)\n" %
+                      (source_name, target_name, len(data[source_name]),
+                       len(rule_index), len(rule_index.shadowed),
+                       len(rule_index.conflicts())))
+        if show_rules:
+            report.append(rule_index.format_shadowed())
+    return ''.join(report)
+
+
+def read_pair(pair: str) -> dict:
+    """
+    Функция читает бинарный файл языковой пары.
+    Возвращает словарь: имя списка -> кортеж строк.
+    Если формат файла не тот, выбрасывает ValueError.
+    """
+    with open(compiled_path(pair), "rb") as f:
+        raw = f.read()
+    header = MAGIC + bytes([FORMAT_VERSION])
+    if raw[:len(header)] != header:
+        raise ValueError("Неправильный формат файла " + compiled_path(pair))
+    return {name: tuple(text.split(SEPARATOR)) if count else ()
+            for name, (count, text) in marshal.loads(raw[len(header):])
+            .items()}
+
+
+def load_pair(pair: str) -> dict:
+    """
+    Функция загружает словари и таблицы языковой пары.
+    Если есть актуальный бинарный файл, читает его, иначе импортирует
+    исходные модули.
+    Возвращает словарь: имя списка -> кортеж строк.
+    """
+    if is_fresh(pair):
+        try:
+            return read_pair(pair)
+        except (ValueError, EOFError):
+            pass
+    return import_pair(pair)
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Компиляция словарей и таблиц в бинарные файлы")
+    parser.add_argument("pairs", nargs="*", metavar="pair",
+                        help="языковые пары: " + ", ".join(sorted(PAIRS)) +
+                             " (по умолчанию все)")
+    parser.add_argument("--show-rules", action="store_true",
+                        help="перечислить скрытые правила таблиц")
+    args = parser.parse_args()
+
+    for pair in args.pairs or sorted(PAIRS):
+        if pair not in PAIRS:
+            parser.error("неизвестная языковая пара: " + pair)
+        path = build_pair(pair)
+        sys.stdout.write(path + ": " + str(os.path.getsize(path)) +
+                         " байт\n")
+        sys.stdout.write(report_rules(pair, read_pair(pair),
+                                      args.show_rules))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+# Словарь и таблицы структурных преобразований в файле, отображенном в
+# память (mmap)
+
+# Обычно каждый процесс переводчика загружает языковую пару (lexicon_store)
+# и строит из нее словари в своей куче: десятки тысяч объектов str, по
+# десятку мегабайт на процесс. Когда на машине работает много процессов
+# (struct_rules_via_table.py -j, несколько translation_server.py), каждый
+# держит свою копию.
+# Здесь словарь одного направления перевода (первый вариант перевода каждой
+# основы, как в build_lexicon) и обе таблицы структурных преобразований
+# записываются в файл compiled/<направление>.<раскладка>.lex. Процессы
+# открывают его через mmap только для чтения и ищут основы прямо в
+# отображенных байтах, ничего не копируя в кучу, поэтому страницы файла
+# одни на все процессы (через кэш страниц ОС), а память процесса почти не
+# отличается от памяти пустого интерпретатора.
+
+# Раскладки (LAYOUTS):
+# - hash (HashedLexicon) - хеш-таблица по crc32 основы, поиск за одну-две
+#   пробы;
+# - sorted (SortedLexicon) - только отсортированные основы и массив
+#   смещений, поиск делением пополам (~15 сравнений на 30 тысяч основ);
+#   файл меньше, а открывается так же мгновенно - для контейнеров с малым
+#   объемом памяти.
+
+# Формат файла (целые числа - 32 бита, в порядке байтов машины, на которой
+# файл собран):
+# - заголовок (HEADER): сигнатура, версия, раскладка, число ячеек
+#   хеш-таблицы, число записей, число правил таблиц;
+# - только в раскладке hash: хеш-таблица (для каждой ячейки номер записи +
+#   1, 0 - пустая ячейка; ячейка ищется по crc32 основы в UTF-8, при
+#   коллизии - следующая ячейка) и crc32 основы каждой записи;
+# - записи: (смещение основы, длина основы, длина перевода); перевод лежит
+#   сразу за основой; старший бит длины перевода (SPLIT_FLAG) означает, что
+#   при выводе перевод не является ровно одним словом
+#   (apertium_stream.output_form); в раскладке sorted записи отсортированы
+#   по байтам основы в UTF-8 (это тот же порядок, что и по символам);
+# - правила: (смещение, длина) строк входной, затем выходной таблицы;
+# - строки в UTF-8.
+
+# Файл собирается первым процессом, которому он понадобился (или если он
+# старее исходных модулей языковой пары), и записывается через временный
+# файл, так что остальные процессы только открывают готовый файл.
+# Включается ключом --mapped-lexicon [hash|sorted] (struct_rules_via_table.py
+# и translation_server.py).
+
+# ==========
+# imports
+# ==========
+
+import abc
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+from apertium_stream import output_form
+from lexicon_store import COMPILED_DIR
+
+# ==========
+# constants
+# ==========
+
+# сигнатура и версия формата файла
+MAGIC = b"SRVM"
+FORMAT_VERSION = 2
+
+# раскладки файла
+LAYOUT_HASH = 0
+LAYOUT_SORTED = 1
+LAYOUTS = {"hash": LAYOUT_HASH, "sorted": LAYOUT_SORTED}
+
+# заголовок: сигнатура, версия, раскладка, число ячеек, число записей,
+# число правил
+HEADER = struct.Struct("=4sBB2xIII")
+
+# поля записи
+ENTRY_KEY = 0
+ENTRY_KEY_LEN = 1
+ENTRY_VALUE_LEN = 2
+ENTRY_SIZE = 3
+
+# перевод при выводе делится на части или пропадает (output_form)
+SPLIT_FLAG = 1 << 31
+
+# наибольшее число запомненных переводов частых основ (в куче процесса)
+# при переполнении запомненное сбрасывается
+WORD_MEMO_SIZE = 1 << 12
+
+# ==========
+# functions
+# ==========
+
+
+def mapped_path(direction: str, layout: str = "hash") -> str:
+    """
+    Функция возвращает путь к файлу словаря направления перевода.
+    пример: eng-kaz, sorted -> compiled/eng-kaz.sorted.lex
+    """
+    return os.path.join(COMPILED_DIR, "%s.%s.lex" % (direction, layout))
+
+
+def slot_count(entry_count: int) -> int:
+    """
+    Функция возвращает число ячеек хеш-таблицы: степень двойки, не меньше
+    удвоенного числа записей (таблица заполнена не больше чем наполовину).
+    """
+    count = 1
+    while count < entry_count * 2:
+        count <<= 1
+    return count
+
+
+def write_lexicon(path: str, layout: str, source_table: list,
+                  target_table: list, source_dic: list,
+                  target_dic: list) -> str:
+    """
+    Функция записывает словарь и таблицы структурных преобразований
+    направления перевода в файл.
+    Если основа встречается в словаре несколько раз, остается первый
+    вариант (как в build_lexicon).
+    Возвращает путь к файлу.
+    Параметры:
+        path: str - путь к файлу
+        layout: str - раскладка файла (hash, sorted)
+        source_table: list - входная таблица тегов
+        target_table: list - выходная таблица тегов
+        source_dic: list - основы слов на входном языке
+        target_dic: list - соответствующие им основы на выходном языке
+    """
+    if layout not in LAYOUTS:
+        raise ValueError("Неизвестная раскладка файла: " + layout)
+
+    words = {}
+    for source_word, target_word in zip(source_dic, target_dic):
+        # первое вхождение основы побеждает
+        if source_word not in words:
+            words[source_word] = target_word
+    items = [(source_word.encode("utf-8"), target_word)
+             for source_word, target_word in words.items()]
+    if layout == "sorted":
+        items.sort(key=lambda item: item[0])
+
+    strings = bytearray()
+    entries = array('I')
+    for key, target_word in items:
+        value = target_word.encode("utf-8")
+        value_len = len(value)
+        if output_form(target_word) is not target_word:
+            value_len |= SPLIT_FLAG
+        entries.extend((len(strings), len(key), value_len))
+        strings += key
+        strings += value
+
+    slots = array('I')
+    hashes = array('I')
+    if layout == "hash":
+        hashes.extend(zlib.crc32(key) for key, _ in items)
+        slots.frombytes(bytes(4 * slot_count(len(items))))
+        mask = len(slots) - 1
+        for idx, key_hash in enumerate(hashes):
+            pos = key_hash & mask
+            while slots[pos]:
+                pos = (pos + 1) & mask
+            slots[pos] = idx + 1
+
+    rules = array('I')
+    for morph in list(source_table) + list(target_table):
+        encoded = morph.encode("utf-8")
+        rules.extend((len(strings), len(encoded)))
+        strings += encoded
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # пишем во временный файл и переименовываем, чтобы параллельно
+    # работающие процессы не открыли недописанный файл
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, LAYOUTS[layout],
+                            len(slots), len(items), len(source_table)))
+        f.write(slots.tobytes())
+        f.write(hashes.tobytes())
+        f.write(entries.tobytes())
+        f.write(rules.tobytes())
+        f.write(strings)
+    os.replace(tmp_path, path)
+    return path
+
+# ==========
+# classes
+# ==========
+
+
+class MappedLexicon(abc.ABC):
+    """
+    Словарь и таблицы структурных преобразований направления перевода в
+    файле, отображенном в память (см. write_lexicon). Поиск основы (find)
+    зависит от раскладки файла и задается в HashedLexicon и SortedLexicon.
+    get работает как словарь build_output_lexicon (перевод в том виде, в
+    котором он выводится), get_escaped - как словарь build_lexicon
+    (пробелы заменены на '_').
+    Поиск в файле в несколько раз дольше, чем в dict, поэтому переводы,
+    найденные через get, запоминаются (не больше WORD_MEMO_SIZE): основы
+    слов в тексте повторяются часто, а память процесса остается маленькой.
+    Если формат или раскладка файла не те, выбрасывает ValueError.
+    Параметры:
+        path: str - путь к файлу
+    """
+
+    # раскладка файла (LAYOUTS)
+    layout = None
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError("Неправильный формат файла " + path)
+        magic, version, layout, slots, entries, rules = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != FORMAT_VERSION or \
+                layout != LAYOUTS[self.layout]:
+            raise ValueError("Неправильный формат файла " + path)
+
+        # разделы файла без копирования: массивы целых чисел поверх mmap
+        # (в раскладке sorted ячеек нет, и хеш-таблица пустая)
+        view = memoryview(self.data)
+        start = HEADER.size
+        sections = []
+        for count in (slots, slots and entries, entries * ENTRY_SIZE,
+                      rules * 4):
+            sections.append(view[start:start + count * 4].cast('I'))
+            start += count * 4
+        self.slots, self.hashes, self.entries, rule_spans = sections
+        self.strings = start
+        self.mask = slots - 1
+        self.entry_count = entries
+        # основа -> перевод для вывода (None - основы нет в словаре)
+        self.memo = {}
+
+        # таблицы маленькие (сотни правил), их строки декодируются сразу
+        morphs = tuple(
+            self.data[start + rule_spans[idx]:
+                      start + rule_spans[idx] + rule_spans[idx + 1]]
+            .decode("utf-8")
+            for idx in range(0, len(rule_spans), 2))
+        self.source_table = morphs[:rules]
+        self.target_table = morphs[rules:]
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def __contains__(self, source_word: str) -> bool:
+        return self.find(source_word) >= 0
+
+    @abc.abstractmethod
+    def find(self, source_word: str) -> int:
+        """
+        Функция ищет основу в файле.
+        Возвращает индекс записи основы в entries или -1.
+        """
+
+    def key(self, base: int) -> bytes:
+        """
+        Функция возвращает основу записи в UTF-8.
+        """
+        start = self.strings + self.entries[base + ENTRY_KEY]
+        return self.data[start:start + self.entries[base + ENTRY_KEY_LEN]]
+
+    def value(self, base: int) -> tuple:
+        """
+        Функция возвращает (перевод, флаг SPLIT_FLAG) записи.
+        """
+        entries = self.entries
+        start = (self.strings + entries[base + ENTRY_KEY] +
+                 entries[base + ENTRY_KEY_LEN])
+        value_len = entries[base + ENTRY_VALUE_LEN]
+        end = start + (value_len & ~SPLIT_FLAG)
+        return self.data[start:end].decode("utf-8"), value_len & SPLIT_FLAG
+
+    def get(self, source_word: str, default=None):
+        """
+        Функция возвращает перевод основы в том виде, в котором он
+        выводится (строка или кортеж слов, как в build_output_lexicon), или
+        default, если основы нет в словаре.
+        """
+        memo = self.memo
+        if source_word in memo:
+            target_word = memo[source_word]
+        else:
+            base = self.find(source_word)
+            target_word = None
+            if base >= 0:
+                target_word, split = self.value(base)
+                if split:
+                    target_word = output_form(target_word)
+            if len(memo) >= WORD_MEMO_SIZE:
+                memo.clear()
+            memo[source_word] = target_word
+        if target_word is None:
+            return default
+        return target_word
+
+    def get_escaped(self, source_word: str, default: str = None) -> str:
+        """
+        Функция возвращает перевод основы с пробелами, замененными на '_'
+        (как в build_lexicon), или default, если основы нет в словаре.
+        """
+        base = self.find(source_word)
+        if base < 0:
+            return default
+        target_word = self.value(base)[0]
+        if ' ' in target_word:
+            target_word = target_word.replace(' ', '_')
+        return target_word
+
+
+class HashedLexicon(MappedLexicon):
+    """
+    Словарь в файле с раскладкой hash: основа ищется в хеш-таблице по
+    crc32.
+    """
+
+    layout = "hash"
+
+    def find(self, source_word: str) -> int:
+        """
+        Функция ищет основу в хеш-таблице.
+        Возвращает индекс записи основы в entries или -1.
+        """
+        key = source_word.encode("utf-8")
+        key_hash = zlib.crc32(key)
+        slots = self.slots
+        hashes = self.hashes
+        mask = self.mask
+        pos = key_hash & mask
+        while True:
+            idx = slots[pos]
+            if not idx:
+                return -1
+            idx -= 1
+            if hashes[idx] == key_hash and \
+                    self.key(idx * ENTRY_SIZE) == key:
+                return idx * ENTRY_SIZE
+            pos = (pos + 1) & mask
+
+
+class SortedLexicon(MappedLexicon):
+    """
+    Словарь в файле с раскладкой sorted: основы отсортированы, и основа
+    ищется делением пополам прямо по байтам файла.
+    """
+
+    layout = "sorted"
+
+    def find(self, source_word: str) -> int:
+        """
+        Функция ищет основу делением пополам.
+        Возвращает индекс записи основы в entries или -1.
+        """
+        key = source_word.encode("utf-8")
+        entries = self.entries
+        data = self.data
+        strings = self.strings
+        low = 0
+        high = self.entry_count
+        while low < high:
+            middle = (low + high) >> 1
+            base = middle * ENTRY_SIZE
+            start = strings + entries[base + ENTRY_KEY]
+            middle_key = data[start:start + entries[base + ENTRY_KEY_LEN]]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return base
+        return -1
+
+
+# раскладка файла -> класс словаря
+LEXICON_CLASSES = {"hash": HashedLexicon, "sorted": SortedLexicon}
@@ -0,0 +1,490 @@
+# Индекс правил таблиц структурных преобразований
+
+# Входная таблица тегов компилируется в префиксное дерево (trie) над
+# отдельными тегами слов. Поиск самой длинной последовательности тегов,
+# которая есть в таблице, делается одним проходом по дереву, вместо того
+# чтобы для каждой длины окна склеивать строку и искать её в списке.
+
+# пример:
+# таблица: "<n><sg>$", "<det><def><sp>$ <n><sg>$"
+# дерево:  <n><sg>$ (конец правила)
+#          <det><def><sp>$ -> <n><sg>$ (конец правила)
+
+# В каждом узле дерева хранится длина самого длинного правила, проходящего
+# через этот узел, поэтому поиск пробует только те длины окна, которые
+# действительно могут совпасть с правилом. Максимальная длина правила
+# берется из таблицы, а не задается числом.
+
+# Теги слов при загрузке таблицы получают целые номера (TagVocab), и поиск
+# по дереву идет по номерам, а не по строкам. В конечном узле дерева лежит
+# номер правила в таблице, так что найденной группе сразу известно её
+# правило.
+
+# Деление на группы зависит только от последовательности номеров тегов, а
+# не от слов, поэтому результаты запоминаются (memo):
+# - для всей последовательности тегов предложения (одинаковые "формы"
+#   предложений делятся на группы без поиска);
+# - для окна из max_len тегов, с которого начинается очередная группа:
+#   найденная на позиции группа зависит только от этих тегов, поэтому
+#   предложения с общими кусками тоже не проходят по дереву заново.
+
+# Для поиска правила по строке тегов целиком (table_struct_transform)
+# таблица компилируется в словарь RuleIndex: строка входных тегов ->
+# номер правила. Если одна и та же строка встречается в таблице несколько
+# раз, используется первое правило (как при поиске через list.index()), а
+# остальные никогда не срабатывают; RuleIndex запоминает такие скрытые
+# правила, чтобы их можно было показать авторам таблиц
+# (python lexicon_store.py --show-rules).
+
+# Для каждого правила таблицы заранее строится карта выравнивания слов:
+# позиция тега целевого языка -> позиция слова входного языка. Во время
+# перевода слова просто выбираются по этой карте.
+# Теги при выравнивании сравниваются по классам эквивалентности первых
+# тегов (TagClasses), которые задаются для каждого направления перевода в
+# tag_classes.py, - вместо цепочки сравнений в compare_tags.
+
+# ==========
+# imports
+# ==========
+
+from tag_classes import VERB_TAGS
+
+# ==========
+# constants
+# ==========
+
+# максимальная длина окна в старом поиске (до индекса правил)
+# используется только для подсчета отброшенных окон
+LEGACY_MAX_LEN = 6
+
+# поля узла дерева:
+# [дети, номер правила или None, длина самого длинного правила]
+CHILDREN = 0
+RULE = 1
+DEPTH = 2
+
+# номер для тегов, которых нет во входной таблице
+UNKNOWN_TAG = -1
+
+# наибольшее число запомненных последовательностей тегов (и отдельно окон)
+# при переполнении запомненное сбрасывается
+SEGMENT_MEMO_SIZE = 1 << 16
+
+# ==========
+# functions
+# ==========
+
+
+def get_first_tag(tags: str) -> str:
+    """
+    Функция получает список тегов и возвращает первый из них.
+    пример: <det><def><sp> -> <det>
+    """
+    if tags == "<unknown_tags>":
+        return None
+
+    if '>' in tags:
+        idx = tags.index('>')
+        return tags[0:idx + 1]
+    else:
+        return None
+
+
+def compare_tags(tag1: str, tag2: str) -> bool:
+    """
+    Функция, сравнивающая теги с учетом разных вариантов для глагола.
+    <vblex> - <v>
+    <vbmod> - <v>
+    <vbhaver> - <v>
+    <vaux> - <vaux>
+    <vbser> - <vbser>
+    """
+    if (tag1 == "<v>" or
+        tag1 == "<vblex>" or
+        tag1 == "<vbmod>" or
+        tag1 == "<vbhaver>") \
+            and (tag2 == "<v>" or
+                 tag2 == "<vblex>" or
+                 tag2 == "<vbmod>" or
+                 tag2 == "<vbhaver>"):
+        return True
+    elif tag1 == tag2:
+        return True
+    else:
+        return False
+
+
+def build_alignment(source_tags: list, target_tags: list,
+                    tag_classes: "TagClasses" = None) -> tuple:
+    """
+    Функция строит карту выравнивания слов для группы тегов: для каждого
+    тега целевого языка - позицию первого слова входного языка, первый тег
+    которого входит в тот же класс эквивалентности (TagClasses), что и
+    первый тег целевого.
+    Если подходящего слова нет, тег целевого языка пропускается.
+    пример: <prn> <vbser> <prep> <det> <n> -> <prn> <n> : (0, 4)
+    Параметры:
+        source_tags: list - теги слов группы на входном языке
+        target_tags: list - теги слов группы на целевом языке
+        tag_classes: TagClasses - классы эквивалентности тегов (None -
+                                  глаголы, как в compare_tags)
+    """
+    if tag_classes is None:
+        tag_classes = DEFAULT_TAG_CLASSES
+    classify = tag_classes.classify
+    # класс первого тега -> позиция первого слова с таким классом
+    first_positions = {}
+    for pos, sour_tags in enumerate(source_tags):
+        first_positions.setdefault(classify(sour_tags), pos)
+    alignment = []
+    for tar_tags in target_tags:
+        pos = first_positions.get(classify(tar_tags))
+        if pos is not None:
+            alignment.append(pos)
+    return tuple(alignment)
+
+
+def build_alignments(source_table: list, target_table: list,
+                     tag_classes: "TagClasses" = None) -> list:
+    """
+    Функция строит карты выравнивания слов для всех правил таблицы
+    структурных преобразований.
+    Возвращает список карт: i-я карта соответствует i-му правилу.
+    Параметры:
+        source_table: list - входная таблица тегов
+        target_table: list - выходная таблица тегов
+        tag_classes: TagClasses - классы эквивалентности тегов (None -
+                                  глаголы, как в compare_tags)
+    """
+    return [build_alignment(source_morph.split(), target_morph.split(),
+                            tag_classes)
+            for source_morph, target_morph in zip(source_table,
+                                                  target_table)]
+
+
+def new_node() -> list:
+    """
+    Функция создает пустой узел дерева.
+    """
+    return [{}, None, 0]
+
+# ==========
+# classes
+# ==========
+
+
+class TagClasses:
+    """
+    Классы эквивалентности первых тегов слов для выравнивания слов.
+    Каждому первому тегу заранее дается номер класса, и сравнение тегов
+    сводится к сравнению двух чисел (вместо цепочки сравнений строк в
+    compare_tags). Тег, которого нет ни в одном классе (и отсутствие
+    первого тега - None), получает свой номер при первой встрече.
+    пример: [["<v>", "<vblex>"]] -> <v>: 0, <vblex>: 0, <n>: 1
+    Параметры:
+        classes: list - классы: списки равных друг другу первых тегов
+                        (см. tag_classes.py)
+    """
+
+    def __init__(self, classes: list):
+        # первый тег -> номер класса
+        self.class_ids = {}
+        for class_id, tags in enumerate(classes):
+            for tag in tags:
+                self.class_ids.setdefault(tag, class_id)
+        self.next_id = len(classes)
+        # теги слова целиком -> номер класса первого тега
+        self.tags_class_ids = {}
+
+    def first_tag_class(self, first_tag: str) -> int:
+        """
+        Функция возвращает номер класса первого тега.
+        """
+        class_id = self.class_ids.get(first_tag)
+        if class_id is None:
+            class_id = self.class_ids[first_tag] = self.next_id
+            self.next_id += 1
+        return class_id
+
+    def classify(self, tags: str) -> int:
+        """
+        Функция возвращает номер класса первого тега из тегов слова.
+        Результат запоминается для каждой строки тегов.
+        пример: <vblex><past> -> номер класса <vblex>
+        """
+        class_id = self.tags_class_ids.get(tags)
+        if class_id is None:
+            class_id = self.first_tag_class(get_first_tag(tags))
+            if len(self.tags_class_ids) >= SEGMENT_MEMO_SIZE:
+                self.tags_class_ids.clear()
+            self.tags_class_ids[tags] = class_id
+        return class_id
+
+
+class TagVocab:
+    """
+    Словарь тегов слов: каждой различной строке тегов дается целый номер.
+    пример: <det><def><sp>$ -> 0
+    """
+
+    def __init__(self):
+        # строка тегов -> номер и обратно
+        self.ids = {}
+        self.tags = []
+
+    def add(self, tags: str) -> int:
+        """
+        Функция добавляет строку тегов в словарь (если её там нет).
+        Возвращает номер строки тегов.
+        """
+        if tags in self.ids:
+            return self.ids[tags]
+        tag_id = len(self.tags)
+        self.ids[tags] = tag_id
+        self.tags.append(tags)
+        return tag_id
+
+    def encode(self, tags: list) -> list:
+        """
+        Функция переводит теги слов предложения в номера.
+        Теги, которых нет в словаре, получают номер UNKNOWN_TAG.
+        Теги с пробелами внутри (испорченный вход) становятся кортежем
+        номеров своих частей, чтобы поиск по дереву шел по частям, как после
+        ' '.join().
+        Параметры:
+            tags: list - теги слов предложения
+        """
+        ids = self.ids
+        tag_ids = []
+        for tag in tags:
+            if ' ' in tag:
+                tag_ids.append(tuple(ids.get(part, UNKNOWN_TAG)
+                                     for part in tag.split(' ')))
+            else:
+                tag_ids.append(ids.get(tag, UNKNOWN_TAG))
+        return tag_ids
+
+
+class RuleIndex:
+    """
+    Индекс правил таблицы структурных преобразований: строка тегов
+    входного языка -> номер первого правила с такой строкой.
+    Параметры:
+        source_table: list - входная таблица тегов
+        target_table: list - выходная таблица тегов
+    """
+
+    def __init__(self, source_table: list, target_table: list):
+        self.source_table = source_table
+        self.target_table = target_table
+        self.rules = {}
+        # скрытые правила: (номер правила, номер первого правила с той же
+        # строкой входных тегов)
+        self.shadowed = []
+        for rule, pattern in enumerate(source_table):
+            first_rule = self.rules.setdefault(pattern, rule)
+            if first_rule != rule:
+                self.shadowed.append((rule, first_rule))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def transform(self, source_morph: str, default: str = None) -> str:
+        """
+        Функция возвращает строку выходных тегов для строки входных тегов
+        или default, если такой строки нет в таблице.
+        """
+        rule = self.rules.get(source_morph)
+        if rule is None:
+            return default
+        return self.target_table[rule]
+
+    def conflicts(self) -> list:
+        """
+        Функция возвращает скрытые правила, у которых выходные теги не
+        совпадают с выходными тегами первого правила (то есть правила,
+        которые задумывались, но никогда не применяются).
+        """
+        return [(rule, first_rule) for rule, first_rule in self.shadowed
+                if self.target_table[rule] != self.target_table[first_rule]]
+
+    def format_shadowed(self) -> str:
+        """
+        Функция возвращает список скрытых правил в виде текста (номера
+        правил считаются с 0, как индексы списков таблиц).
+        """
+        conflicts = set(self.conflicts())
+        lines = []
+        for rule, first_rule in self.shadowed:
+            lines.append("  %d: %s -> %s" % (rule, self.source_table[rule],
+                                             self.target_table[rule]))
+            if (rule, first_rule) in conflicts:
+                lines.append("      скрыто правилом %d: -> %s" %
+                             (first_rule, self.target_table[first_rule]))
+            else:
+                lines.append("      повторяет правило %d" % first_rule)
+        return '\n'.join(lines) + '\n' if lines else ""
+
+
+class TagTrie:
+    """
+    Префиксное дерево над номерами тегов слов для поиска правил таблицы
+    структурных преобразований.
+    Параметры:
+        patterns: list - входная таблица тегов: строки, в которых теги
+                         отдельных слов разделены пробелом
+    """
+
+    def __init__(self, patterns: list):
+        self.vocab = TagVocab()
+        self.root = new_node()
+        for rule, pattern in enumerate(patterns):
+            # делим строго по одному пробелу, чтобы ' '.join() от тегов
+            # слов совпадал с правилом тогда и только тогда, когда совпадает
+            # путь в дереве
+            tag_ids = [self.vocab.add(tag) for tag in pattern.split(' ')]
+            node = self.root
+            node[DEPTH] = max(node[DEPTH], len(tag_ids))
+            for tag_id in tag_ids:
+                node = node[CHILDREN].setdefault(tag_id, new_node())
+                node[DEPTH] = max(node[DEPTH], len(tag_ids))
+            # если правило встречается несколько раз, используется первое
+            # (как при поиске через list.index())
+            if node[RULE] is None:
+                node[RULE] = rule
+        # длина самого длинного правила таблицы (в словах)
+        self.max_len = self.root[DEPTH]
+
+        # запомненные деления на группы:
+        # последовательность номеров тегов -> группы,
+        # окно номеров тегов -> (длина группы, номер правила или None)
+        self.sequence_memo = {}
+        self.window_memo = {}
+        self.sequence_hits = 0
+        self.sequence_misses = 0
+        self.window_hits = 0
+        self.window_misses = 0
+
+    def walk(self, tag_ids: list, start: int) -> tuple:
+        """
+        Функция проходит по дереву, начиная с позиции start.
+        Возвращает (длина самой длинной найденной последовательности тегов
+        или 0, номер её правила или None, количество проверенных окон).
+        Параметры:
+            tag_ids: list - номера тегов слов предложения (TagVocab.encode)
+            start: int - позиция, с которой начинается поиск
+        """
+        node = self.root
+        best = 0
+        best_rule = None
+        pos = start
+        # дальше самого длинного правила через текущий узел идти незачем
+        while pos < len(tag_ids) and pos - start < node[DEPTH]:
+            tag_id = tag_ids[pos]
+            child = node[CHILDREN].get(tag_id)
+            if child is None:
+                if tag_id.__class__ is not tuple:
+                    return best, best_rule, pos - start + 1
+                # теги с пробелами внутри проходят по дереву по частям
+                child = node
+                for part in tag_id:
+                    child = child[CHILDREN].get(part)
+                    if child is None:
+                        return best, best_rule, pos - start + 1
+            node = child
+            pos += 1
+            if node[RULE] is not None:
+                best = pos - start
+                best_rule = node[RULE]
+        return best, best_rule, pos - start
+
+    def match_rules(self, tag_ids: list) -> tuple:
+        """
+        Функция делит предложение на группы тегов.
+        Группы ищутся слева направо, начиная с самых длинных; если на
+        позиции ничего не найдено, группой становится один тег.
+        Возвращает кортеж групп: (начало, конец, номер правила или None).
+        Результат запоминается и отдается всем предложениям с той же
+        последовательностью тегов, поэтому изменять его нельзя.
+        Параметры:
+            tag_ids: list - номера тегов слов предложения (TagVocab.encode)
+        """
+        key = tuple(tag_ids)
+        groups = self.sequence_memo.get(key)
+        if groups is not None:
+            self.sequence_hits += 1
+            return groups
+        self.sequence_misses += 1
+        groups = self.find_rules(key)
+        if len(self.sequence_memo) >= SEGMENT_MEMO_SIZE:
+            self.sequence_memo.clear()
+        self.sequence_memo[key] = groups
+        return groups
+
+    def find_rules(self, tag_ids: tuple) -> tuple:
+        """
+        Функция делит предложение на группы тегов (см. match_rules), не
+        обращаясь к запомненным последовательностям; группа на каждой
+        позиции берется из запомненных окон или ищется по дереву.
+        Параметры:
+            tag_ids: tuple - номера тегов слов предложения
+        """
+        window_memo = self.window_memo
+        max_len = self.max_len
+        groups = []
+        current_tag = 0
+        while current_tag < len(tag_ids):
+            window = tag_ids[current_tag:current_tag + max_len]
+            match = window_memo.get(window)
+            if match is None:
+                self.window_misses += 1
+                found, rule, _ = self.walk(tag_ids, current_tag)
+                match = (found or 1, rule)
+                if len(window_memo) >= SEGMENT_MEMO_SIZE:
+                    window_memo.clear()
+                window_memo[window] = match
+            else:
+                self.window_hits += 1
+            found, rule = match
+            groups.append((current_tag, current_tag + found, rule))
+            current_tag += found
+        return tuple(groups)
+
+    def memo_stats(self) -> dict:
+        """
+        Функция возвращает счетчики запомненных делений на группы:
+        попадания и промахи для последовательностей тегов и для окон.
+        """
+        return {
+            "sequence_hits": self.sequence_hits,
+            "sequence_misses": self.sequence_misses,
+            "window_hits": self.window_hits,
+            "window_misses": self.window_misses,
+        }
+
+    def count_windows(self, tag_ids: list) -> tuple:
+        """
+        Функция считает окна (длины последовательностей тегов), проверенные
+        при делении предложения на группы.
+        Возвращает (проверено деревом, проверил бы старый поиск по окнам
+        длиной от LEGACY_MAX_LEN до 1).
+        Параметры:
+            tag_ids: list - номера тегов слов предложения (TagVocab.encode)
+        """
+        checked = 0
+        legacy = 0
+        current_tag = 0
+        while current_tag < len(tag_ids):
+            found, _, walked = self.walk(tag_ids, current_tag)
+            checked += walked
+            max_len = min(LEGACY_MAX_LEN, len(tag_ids) - current_tag)
+            # старый поиск перебирал длины от max_len вниз до найденной
+            legacy += max_len - found + 1 if found else max_len
+            current_tag += found or 1
+        return checked, legacy
+
+
+# классы эквивалентности тегов по умолчанию (см. build_alignment)
+# глаголы, как в compare_tags (для направлений перевода классы задаются в
+# tag_classes.py)
+DEFAULT_TAG_CLASSES = TagClasses([VERB_TAGS])
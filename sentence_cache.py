@@ -0,0 +1,136 @@
+# Кэш переводов предложений
+
+# Во входных текстах много повторов (шаблонные предложения, заголовки),
+# и каждый повтор заново проходит разбор, деление на группы тегов,
+# подбор слов и перевод по словарю. Кэш хранит готовые строки перевода по
+# ключу (направление перевода, нормализованная строка входа) и вытесняет
+# давно не использованные записи (LRU), когда превышен предел числа
+# записей или их размера в байтах.
+
+# Нормализация убирает только то, что не влияет на перевод: пробелы по
+# краям строки (в том числе символ конца строки) и кавычки ' и ", которые
+# всё равно удаляются при разборе (apertium_stream.remove_quotes).
+
+# ==========
+# imports
+# ==========
+
+import sys
+from collections import OrderedDict
+
+from apertium_stream import remove_quotes
+
+# ==========
+# functions
+# ==========
+
+
+def normalize_line(line: str) -> str:
+    """
+    Функция нормализует строку входа для ключа кэша.
+    пример: ' ^text<n><sg>$ ^"<sent>$\\n' -> '^text<n><sg>$ ^<sent>$'
+    """
+    return remove_quotes(line.strip())
+
+
+def entry_size(key: tuple, output: str) -> int:
+    """
+    Функция оценивает размер записи кэша в байтах (строка входа и строка
+    перевода).
+    """
+    return sys.getsizeof(key[1]) + sys.getsizeof(output)
+
+# ==========
+# classes
+# ==========
+
+
+class SentenceCache:
+    """
+    Кэш переводов предложений с вытеснением давно не использованных
+    записей (LRU). Один кэш можно использовать для нескольких направлений
+    перевода.
+    Параметры:
+        max_entries: int - наибольшее число записей (None - без предела)
+        max_bytes: int - наибольший суммарный размер записей в байтах
+                         (None - без предела)
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(direction: str, line: str) -> tuple:
+        """
+        Функция возвращает ключ кэша для строки входа.
+        """
+        return direction, normalize_line(line)
+
+    def get(self, key: tuple) -> str:
+        """
+        Функция возвращает перевод из кэша или None, если его там нет.
+        """
+        output = self.entries.get(key)
+        if output is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return output
+
+    def put(self, key: tuple, output: str):
+        """
+        Функция добавляет перевод в кэш и вытесняет самые давно
+        использованные записи, если кэш переполнен.
+        """
+        size = entry_size(key, output)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # запись больше всего кэша не сохраняется
+            return
+        if key in self.entries:
+            self.size -= entry_size(key, self.entries.pop(key))
+        self.entries[key] = output
+        self.size += size
+        while (self.max_entries is not None and
+               len(self.entries) > self.max_entries) or \
+                (self.max_bytes is not None and self.size > self.max_bytes):
+            old_key, old_output = self.entries.popitem(last=False)
+            self.size -= entry_size(old_key, old_output)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Функция очищает кэш (счетчики сохраняются).
+        """
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        """
+        Функция возвращает счетчики кэша.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def format_stats(self) -> str:
+        """
+        Функция возвращает счетчики кэша в виде строки.
+        """
+        stats = self.stats()
+        stats["hit_rate"] *= 100.0
+        return ("кэш предложений: попаданий %(hits)d, промахов %(misses)d "
+                "(%(hit_rate).1f%% попаданий), вытеснено %(evictions)d, "
+                "записей %(entries)d, %(bytes)d байт\n" % stats)
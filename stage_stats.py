@@ -0,0 +1,96 @@
+# Время работы этапов перевода и счетчики
+
+# Включается ключом --profile (struct_rules_via_table.py и
+# translation_server.py). Тогда вместо Translator используется
+# ProfilingTranslator, который замеряет время каждого этапа:
+# - tokenize - разбор строки (parse_line);
+# - segment - деление на группы тегов (TagTrie.match_rules);
+# - struct_transform - теги целевого языка для групп (transform_groups);
+# - alignment - подбор слов под теги (align_words);
+# - translate - перевод слов по словарю и сборка строки (render);
+# и считает строки, слова, группы, группы без правила в таблице
+# (<unknown_tags>), слова без перевода (unknown_word) и добавленные
+# "экстра-слова" (extra_word).
+# Без --profile используется обычный Translator, и замеры ничего не стоят.
+
+# Сводка выводится в stderr при завершении программы и по сигналу SIGUSR1
+# (kill -USR1 <pid>), не останавливая работу.
+
+# ==========
+# imports
+# ==========
+
+import atexit
+import signal
+import sys
+
+# ==========
+# constants
+# ==========
+
+# этапы перевода в порядке выполнения
+STAGES = ("tokenize", "segment", "struct_transform", "alignment",
+          "translate")
+
+# счетчики
+COUNTERS = ("lines", "tokens", "groups", "unknown_tags", "unknown_word",
+            "extra_word")
+
+# ==========
+# classes
+# ==========
+
+
+class StageStats:
+    """
+    Время работы этапов перевода (в секундах) и счетчики.
+    Один объект можно отдать нескольким переводчикам.
+    """
+
+    def __init__(self):
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def as_dict(self) -> dict:
+        """
+        Функция возвращает время этапов и счетчики в виде словаря.
+        """
+        return {"times": dict(self.times), "counts": dict(self.counts)}
+
+    def format(self) -> str:
+        """
+        Функция возвращает сводку в виде текста.
+        """
+        total = sum(self.times.values())
+        lines = ["этапы перевода (всего %.3f с):" % total]
+        for stage in STAGES:
+            seconds = self.times[stage]
+            lines.append("  %-16s %9.3f с %6.1f%%" %
+                         (stage, seconds,
+                          100.0 * seconds / total if total else 0.0))
+        lines.append("счетчики:")
+        for counter in COUNTERS:
+            lines.append("  %-16s %9d" % (counter, self.counts[counter]))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, stream=None):
+        """
+        Функция выводит сводку (по умолчанию в stderr).
+        """
+        stream = stream or sys.stderr
+        stream.write(self.format())
+        stream.flush()
+
+# ==========
+# functions
+# ==========
+
+
+def install_dump(stats: StageStats):
+    """
+    Функция настраивает вывод сводки при завершении программы и по сигналу
+    SIGUSR1 (если он есть на этой платформе).
+    """
+    atexit.register(stats.dump)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: stats.dump())
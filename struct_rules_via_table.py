@@ -13,22 +13,216 @@
 # imports
 # ==========
 
+import argparse
+import gc
+import multiprocessing
 import sys
-from collections import namedtuple
+import time
+from collections import deque
+from itertools import islice
 
-# импортируем таблицы структурных преобразований
-# TODO придумать, как сделать условное импортирование таблиц
-# TODO в зависимости от значения переменной direction
-from tables_eng_kaz import kaz_tags_4_eng_kaz, eng_tags_4_eng_kaz
-from tables_kaz_rus import kaz_tags_4_kaz_rus, rus_tags_4_kaz_rus
-# импортируем таблицы словаря
-from eng_kaz_dic import eng_4_eng_kaz, kaz_4_eng_kaz
-from kaz_rus_dic import kaz_4_kaz_rus, rus_4_kaz_rus
+from apertium_stream import (NULL_FLUSH, open_input, open_output,
+                             output_form, read_null_blocks, split_line)
+from lexicon_store import is_fresh, load_pair
+from mapped_lexicon import (LEXICON_CLASSES, MappedLexicon, mapped_path,
+                            write_lexicon)
+# compare_tags и get_first_tag импортируются и для тех, кто берет их отсюда
+from rule_index import (RuleIndex, TagClasses, TagTrie,  # noqa
+                        build_alignment, build_alignments, compare_tags,
+                        get_first_tag)
+from sentence_cache import SentenceCache
+from stage_stats import StageStats, install_dump
+from tag_classes import TAG_CLASSES
+
+# ==========
+# constants
+# ==========
+
+# для каждого направления перевода: языковая пара (файлы словаря и таблиц,
+# см. lexicon_store.py) и имена списков в ней:
+# (входные теги, выходные теги, входные основы, выходные основы)
+DIRECTIONS = {
+    "eng-kaz": ("eng_kaz", "eng_tags_4_eng_kaz", "kaz_tags_4_eng_kaz",
+                "eng_4_eng_kaz", "kaz_4_eng_kaz"),
+    "kaz-eng": ("eng_kaz", "kaz_tags_4_eng_kaz", "eng_tags_4_eng_kaz",
+                "kaz_4_eng_kaz", "eng_4_eng_kaz"),
+    "rus-kaz": ("kaz_rus", "rus_tags_4_kaz_rus", "kaz_tags_4_kaz_rus",
+                "rus_4_kaz_rus", "kaz_4_kaz_rus"),
+    "kaz-rus": ("kaz_rus", "kaz_tags_4_kaz_rus", "rus_tags_4_kaz_rus",
+                "kaz_4_kaz_rus", "rus_4_kaz_rus"),
+}
+
+# сколько строк отдавать процессу-обработчику за раз в параллельном режиме
+PARALLEL_CHUNK_SIZE = 1000
+
+# теги целевого языка для группы, которой нет в таблице, и перевод слова,
+# которого нет в словаре
+# нижнее подчеркивание обязательно, чтобы при split() это не стало
+# 2 отдельными строками; при выводе оно заменяется на пробел
+UNKNOWN_TARGET = ["<unknown_tags>"]
+UNKNOWN_TARGET_OUTPUT = ["<unknown tags>"]
+UNKNOWN_WORD_OUTPUT = "unknown word"
 
 # ==========
 # functions
 # ==========
 
+# загруженные таблицы структурных преобразований и таблицы словаря,
+# по одной записи на языковую пару
+# загружаются только при первом обращении к направлению перевода, поэтому
+# процесс, работающий с eng-kaz, не трогает kaz_rus_dic.py
+pairs = {}
+
+
+def get_direction_lists(direction: str) -> tuple:
+    """
+    Функция загружает (при первом обращении) языковую пару для направления
+    перевода и возвращает её списки:
+    (входные теги, выходные теги, входные основы, выходные основы)
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    # если направление перевода задано неверно, выбросить exception
+    if direction not in DIRECTIONS:
+        raise ValueError("Неправильно задано направление перевода")
+
+    pair, *names = DIRECTIONS[direction]
+    if pair not in pairs:
+        pairs[pair] = load_pair(pair)
+    return tuple(pairs[pair][name] for name in names)
+
+
+# словари и таблицы в файлах, отображенных в память (MappedLexicon), по
+# одному на направление перевода; если направление здесь есть, его словарь
+# и таблицы берутся из файла, а языковая пара не загружается
+mapped_lexicons = {}
+
+
+def use_mapped_lexicon(direction: str, layout: str = "hash") -> MappedLexicon:
+    """
+    Функция включает для направления перевода словарь и таблицы из файла,
+    отображенного в память (см. mapped_lexicon.py). Если файла нет или он
+    старее исходных модулей языковой пары, он собирается.
+    Вызывается до создания переводчиков этого направления.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+        layout: str - раскладка файла: hash (хеш-таблица) или sorted
+                      (отсортированные основы, поиск делением пополам)
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError("Неправильно задано направление перевода")
+    if layout not in LEXICON_CLASSES:
+        raise ValueError("Неизвестная раскладка файла: " + layout)
+    mapped = mapped_lexicons.get(direction)
+    if mapped is not None and mapped.layout == layout:
+        return mapped
+
+    lexicon_class = LEXICON_CLASSES[layout]
+    path = mapped_path(direction, layout)
+    pair, *names = DIRECTIONS[direction]
+    if is_fresh(pair, path):
+        try:
+            mapped_lexicons[direction] = lexicon_class(path)
+            return mapped_lexicons[direction]
+        except ValueError:
+            pass
+    # языковая пара нужна только для сборки файла, поэтому в pairs она не
+    # сохраняется (иначе списки остались бы в памяти процесса)
+    data = pairs.get(pair) or load_pair(pair)
+    write_lexicon(path, layout, *(data[name] for name in names))
+    mapped_lexicons[direction] = lexicon_class(path)
+    return mapped_lexicons[direction]
+
+
+def get_tables(direction: str) -> tuple:
+    """
+    Функция возвращает пару таблиц структурных преобразований
+    (входная, выходная) для заданного направления перевода.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction in mapped_lexicons:
+        mapped = mapped_lexicons[direction]
+        return mapped.source_table, mapped.target_table
+    source_table, target_table, _, _ = get_direction_lists(direction)
+    return source_table, target_table
+
+
+# деревья входных таблиц тегов, по одному на направление перевода
+tag_tries = {}
+
+
+def get_tag_trie(direction: str) -> TagTrie:
+    """
+    Функция возвращает префиксное дерево входной таблицы тегов для
+    заданного направления перевода. При первом обращении дерево строится и
+    запоминается.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction not in tag_tries:
+        source_table, _ = get_tables(direction)
+        tag_tries[direction] = TagTrie(source_table)
+    return tag_tries[direction]
+
+
+# классы эквивалентности тегов для выравнивания слов (tag_classes.py), по
+# одному набору на направление перевода
+tag_class_tables = {}
+
+
+def get_tag_classes(direction: str) -> TagClasses:
+    """
+    Функция возвращает классы эквивалентности тегов для выравнивания слов
+    в заданном направлении перевода (см. tag_classes.py). При первом
+    обращении они строятся и запоминаются.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction not in tag_class_tables:
+        tag_class_tables[direction] = TagClasses(TAG_CLASSES[direction])
+    return tag_class_tables[direction]
+
+
+# карты выравнивания слов для правил входной таблицы, по одной на
+# направление перевода
+alignment_maps = {}
+
+
+def get_alignments(direction: str) -> list:
+    """
+    Функция возвращает карты выравнивания слов (см. rule_index.py) для
+    правил таблицы структурных преобразований заданного направления
+    (i-я карта - для i-го правила).
+    При первом обращении карты строятся и запоминаются.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction not in alignment_maps:
+        source_table, target_table = get_tables(direction)
+        alignment_maps[direction] = build_alignments(
+            source_table, target_table, get_tag_classes(direction))
+    return alignment_maps[direction]
+
+
+# индексы правил входных таблиц (строка тегов -> номер правила), по одному
+# на направление перевода
+rule_indexes = {}
+
+
+def get_rule_index(direction: str) -> RuleIndex:
+    """
+    Функция возвращает индекс правил таблицы структурных преобразований
+    (см. rule_index.py) для заданного направления перевода. При первом
+    обращении индекс строится и запоминается.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction not in rule_indexes:
+        source_table, target_table = get_tables(direction)
+        rule_indexes[direction] = RuleIndex(source_table, target_table)
+    return rule_indexes[direction]
+
 
 def table_struct_transform(direction: str, source_morph: str) -> str:
     """
@@ -38,33 +232,123 @@ def table_struct_transform(direction: str, source_morph: str) -> str:
         direction: str - направление преобразования (kaz-eng, eng-kaz)
         source_morph: str - морфологический разбор входного языка
     """
-    # определяем индекс морфологического разбора в таблице
-    if source_morph in source_table:
-        idx = source_table.index(source_morph)
-    # если индекс морфологического разбора отсутствует в таблице,
-    # вернуть <unknown_tags>
+    # ищем первое правило с таким морфологическим разбором в индексе
+    # если морфологический разбор отсутствует в таблице, вернуть
+    # <unknown_tags>
     # нижнее подчеркивание обязательно, чтобы позже при split() это не стало
     # 2 отдельными строками
-    else:
-        return "<unknown_tags>"
+    return get_rule_index(direction).transform(source_morph,
+                                               "<unknown_tags>")
 
-    # возвращаем выходной морфологический разбор, соответствующий индексу
-    return target_table[idx]
 
+def build_lexicon(source_dic: list, target_dic: list) -> dict:
+    """
+    Функция строит словарь (хеш-таблицу) для перевода основ слов.
+    Ключ - основа слова на входном языке, значение - основа на выходном.
+    Если основа встречается в списке несколько раз, остается первый
+    вариант (как при поиске через list.index()).
+    Пробелы в выходных основах сразу заменяются на '_'.
+    Параметры:
+        source_dic: list - основы слов на входном языке
+        target_dic: list - соответствующие им основы на выходном языке
+    """
+    lexicon = {}
+    for source_word, target_word in zip(source_dic, target_dic):
+        # первое вхождение основы побеждает
+        if source_word in lexicon:
+            continue
+        # '_' будет заменено обратно на пробел при выводе
+        if ' ' in target_word:
+            target_word = target_word.replace(' ', '_')
+        lexicon[source_word] = target_word
+    return lexicon
 
-def get_first_tag(tags: str) -> str:
+
+# построенные словари, по одному на направление перевода
+# строятся один раз за время работы процесса, при первом обращении
+lexicons = {}
+
+
+def get_lexicon(direction: str) -> dict:
     """
-    Функция получает список тегов и возвращает первый из них.
-    пример: <det><def><sp> -> <det>
+    Функция возвращает словарь для перевода основ слов в заданном
+    направлении. При первом обращении словарь строится и запоминается.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
     """
-    if tags == "<unknown_tags>":
-        return None
+    if direction in lexicons:
+        return lexicons[direction]
 
-    if '>' in tags:
-        idx = tags.index('>')
-        return tags[0:idx + 1]
-    else:
-        return None
+    _, _, source_dic, target_dic = get_direction_lists(direction)
+    lexicons[direction] = build_lexicon(source_dic, target_dic)
+    return lexicons[direction]
+
+
+# словари со всеми вариантами перевода (CandidateLexicon), по одному на
+# направление перевода; строятся только по запросу
+candidate_lexicons = {}
+
+
+def get_candidate_lexicon(direction: str) -> "CandidateLexicon":
+    """
+    Функция возвращает словарь со всеми вариантами перевода основ слов в
+    заданном направлении. При первом обращении словарь строится и
+    запоминается. В файле, отображенном в память (use_mapped_lexicon),
+    только первые варианты, поэтому для этого словаря языковая пара
+    загружается всегда.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction not in candidate_lexicons:
+        _, _, source_dic, target_dic = get_direction_lists(direction)
+        candidate_lexicons[direction] = CandidateLexicon(source_dic,
+                                                         target_dic)
+    return candidate_lexicons[direction]
+
+
+def build_output_lexicon(source_dic: list, target_dic: list) -> dict:
+    """
+    Функция строит словарь переводов основ слов в том виде, в котором они
+    выводятся: с пробелами, как в словаре, без замены на '_'.
+    Ключ - основа слова на входном языке, значение - строка для вывода.
+    Если перевод при выводе не является ровно одним словом (пустой перевод
+    пропадает, перевод с табуляцией делится на части), значение - кортеж
+    слов для вывода.
+    Если основа встречается в списке несколько раз, остается первый
+    вариант (как в build_lexicon).
+    Параметры:
+        source_dic: list - основы слов на входном языке
+        target_dic: list - соответствующие им основы на выходном языке
+    """
+    output_lexicon = {}
+    for source_word, target_word in zip(source_dic, target_dic):
+        # первое вхождение основы побеждает
+        if source_word in output_lexicon:
+            continue
+        output_lexicon[source_word] = output_form(target_word)
+    return output_lexicon
+
+
+# словари переводов для вывода, по одному на направление перевода
+output_lexicons = {}
+
+
+def get_output_lexicon(direction: str) -> dict:
+    """
+    Функция возвращает словарь переводов для вывода (build_output_lexicon)
+    в заданном направлении. При первом обращении словарь строится и
+    запоминается. Если для направления включен файл, отображенный в память
+    (use_mapped_lexicon), возвращается MappedLexicon с тем же методом get.
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz, ...)
+    """
+    if direction in mapped_lexicons:
+        return mapped_lexicons[direction]
+    if direction not in output_lexicons:
+        _, _, source_dic, target_dic = get_direction_lists(direction)
+        output_lexicons[direction] = build_output_lexicon(source_dic,
+                                                          target_dic)
+    return output_lexicons[direction]
 
 
 def table_translate(direction: str, source_word: str) -> str:
@@ -75,254 +359,680 @@ def table_translate(direction: str, source_word: str) -> str:
         direction: str - направление перевода (kaz-eng, eng-kaz)
         source_word: str - основа слова на входном языке
     """
+    # если основа слова отсутствует в словаре, вернуть unknown_word
+    # нижнее подчеркивание обязательно, чтобы позже при split() это не
+    # стало 2 отдельными строками
+    if direction in mapped_lexicons:
+        return mapped_lexicons[direction].get_escaped(source_word,
+                                                      "unknown_word")
+    return get_lexicon(direction).get(source_word, "unknown_word")
 
-    # определяем направление перевода
-    if direction == "kaz-eng":
-        source_dic = kaz_4_eng_kaz
-        target_dic = eng_4_eng_kaz
-    elif direction == "eng-kaz":
-        source_dic = eng_4_eng_kaz
-        target_dic = kaz_4_eng_kaz
-    elif direction == "kaz-rus":
-        source_dic = kaz_4_kaz_rus
-        target_dic = rus_4_kaz_rus
-    elif direction == "rus-kaz":
-        source_dic = rus_4_kaz_rus
-        target_dic = kaz_4_kaz_rus
-    # если направление перевода задано неверно, выбросить exception
-    else:
-        raise ValueError("Неправильно задано направление перевода")
 
-    # определяем индекс основы слова в таблице
-    if source_word in source_dic:
-        idx = source_dic.index(source_word)
-        # находим выходную основу слова, соответствующую индексу
-        res = target_dic[idx]
-        # если найденная основа содержит пробелы, заменить их на '_'
-        # '_' будет заменено обратно на пробел при выводе
-        if ' ' in res:
-            res = res.replace(' ', '_')
-        return res
-    else:
-        # если индекс основы слова отсутствует в таблице,
-        # вернуть unknown_word
-        # нижнее подчеркивание обязательно, чтобы позже при split() это не
-        # стало 2 отдельными строками
-        return "unknown_word"
-
-
-def compare_tags(tag1: str, tag2: str) -> bool:
-    """
-    Функция, сравнивающая теги с учетом разных вариантов для глагола.
-    <vblex> - <v>
-    <vbmod> - <v>
-    <vbhaver> - <v>
-    <vaux> - <vaux>
-    <vbser> - <vbser>
-    """
-    if (tag1 == "<v>" or
-        tag1 == "<vblex>" or
-        tag1 == "<vbmod>" or
-        tag1 == "<vbhaver>") \
-            and (tag2 == "<v>" or
-                 tag2 == "<vblex>" or
-                 tag2 == "<vbmod>" or
-                 tag2 == "<vbhaver>"):
-        return True
-    elif tag1 == tag2:
-        return True
-    else:
-        return False
+def table_translate_all(direction: str, source_word: str) -> tuple:
+    """
+    Функция принимает на вход основу слова на одном языке.
+    Возвращает все варианты её перевода в порядке словаря (первый - тот
+    же, что у table_translate) или ("unknown_word",).
+    Параметры:
+        direction: str - направление перевода (kaz-eng, eng-kaz)
+        source_word: str - основа слова на входном языке
+    """
+    return get_candidate_lexicon(direction).get_all(source_word) \
+        or ("unknown_word",)
+
+
+def parse_line(line: str) -> tuple:
+    """
+    Функция разбирает строку со словами с морфологическими анализами
+    (см. apertium_stream.py).
+    Возвращает (список основ слов, список тегов слов).
+    Слова без тегов и знаки препинания <sent> пропускаются.
+    пример: ^the<det><def><sp>$ ^text<n><sg>$^.<sent>$ ->
+            (["the", "text"], ["<det><def><sp>$", "<n><sg>$"])
+    """
+    return split_line(line)
+
+
+# ==========
+# classes
+# ==========
+
+class CandidateLexicon:
+    """
+    Словарь со всеми вариантами перевода основ слов.
+    Варианты всех основ лежат в одном кортеже candidates: варианты одной
+    основы - подряд, в порядке словаря, без повторов. index хранит для
+    каждой основы начало и конец её блока, поэтому и первый вариант, и все
+    варианты находятся за O(1), без прохода по спискам словаря.
+    Пробелы в вариантах заменены на '_', как в build_lexicon, так что
+    первый вариант совпадает с результатом table_translate.
+    пример (kaz-eng): get_all("туралы") == ("about", "concerning",
+                                             "regarding"),
+                      first("туралы") == "about"
+    Параметры:
+        source_dic: list - основы слов на входном языке
+        target_dic: list - соответствующие им основы на выходном языке
+    """
+
+    def __init__(self, source_dic: list, target_dic: list):
+        # варианты каждой основы в порядке первого появления основы
+        grouped = {}
+        for source_word, target_word in zip(source_dic, target_dic):
+            if ' ' in target_word:
+                target_word = target_word.replace(' ', '_')
+            variants = grouped.setdefault(source_word, [])
+            if target_word not in variants:
+                variants.append(target_word)
+
+        candidates = []
+        self.index = {}
+        for source_word, variants in grouped.items():
+            start = len(candidates)
+            candidates.extend(variants)
+            self.index[source_word] = (start, len(candidates))
+        self.candidates = tuple(candidates)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, source_word: str) -> bool:
+        return source_word in self.index
+
+    def first(self, source_word: str, default: str = None) -> str:
+        """
+        Функция возвращает первый вариант перевода основы (тот, что
+        выбирает table_translate) или default, если основы нет в словаре.
+        """
+        span = self.index.get(source_word)
+        if span is None:
+            return default
+        return self.candidates[span[0]]
+
+    def get_all(self, source_word: str) -> tuple:
+        """
+        Функция возвращает все варианты перевода основы в порядке словаря
+        или пустой кортеж, если основы нет в словаре.
+        """
+        span = self.index.get(source_word)
+        if span is None:
+            return ()
+        return self.candidates[span[0]:span[1]]
+
+    def ambiguous(self) -> int:
+        """
+        Функция возвращает количество основ, у которых больше одного
+        варианта перевода.
+        """
+        return sum(1 for start, end in self.index.values() if end - start > 1)
+
+
+class Translator:
+    """
+    Переводчик для одного направления перевода.
+    Таблицы структурных преобразований и словарь загружаются один раз при
+    создании объекта, после чего объект можно использовать для перевода
+    любого количества строк.
+    В одном процессе могут одновременно существовать переводчики для разных
+    направлений.
+    Параметры:
+        direction: str - направление перевода (eng-kaz, kaz-eng, rus-kaz,
+                          kaz-rus)
+        cache: SentenceCache - кэш переводов предложений (None - без кэша);
+                               один кэш можно отдать нескольким переводчикам
+    """
+
+    def __init__(self, direction: str, cache: SentenceCache = None):
+        self.direction = direction
+        self.cache = cache
+        # таблицы структурных преобразований
+        self.source_table, self.target_table = get_tables(direction)
+        # индекс правил по строке тегов и дерево входной таблицы для поиска
+        # групп тегов
+        self.rule_index = get_rule_index(direction)
+        self.tag_trie = get_tag_trie(direction)
+        # для каждого правила таблицы: теги слов на целевом языке и карта
+        # выравнивания слов
+        self.target_lists = [target_morph.split()
+                             for target_morph in self.target_table]
+        self.alignments = get_alignments(direction)
+        # классы эквивалентности тегов для выравнивания групп, которых нет в
+        # таблице
+        self.tag_classes = get_tag_classes(direction)
+        # словарь для перевода основ слов (в том виде, как они выводятся)
+        self.output_lexicon = get_output_lexicon(direction)
+
+    def struct_transform(self, source_morph: str) -> str:
+        """
+        Функция принимает на вход морфологический разбор входного языка.
+        Возвращает соответствующий ему морфологический разбор выходного
+        языка или <unknown_tags>.
+        """
+        return self.rule_index.transform(source_morph, "<unknown_tags>")
+
+    def translate_word(self, source_word: str) -> str:
+        """
+        Функция принимает на вход основу слова на входном языке.
+        Возвращает основу слова на выходном языке или unknown_word.
+        """
+        return table_translate(self.direction, source_word)
+
+    def translate_word_candidates(self, source_word: str) -> tuple:
+        """
+        Функция принимает на вход основу слова на входном языке.
+        Возвращает все варианты её перевода (первый - тот же, что у
+        translate_word) или ("unknown_word",).
+        """
+        return table_translate_all(self.direction, source_word)
+
+    def select_words(self, source_words: list, source_tags: list,
+                     groups: list) -> list:
+        """
+        Функция для каждой группы тегов подбирает основы слов входного
+        языка под теги целевого языка.
+        Возвращает список пар (основы слов, теги целевого языка) по группам.
+        Параметры:
+            source_words: list - основы слов предложения
+            source_tags: list - теги слов предложения
+            groups: list - группы тегов (TagTrie.match_rules)
+        """
+        return self.align_words(source_words, source_tags, groups,
+                                self.transform_groups(groups))
+
+    def transform_groups(self, groups: list) -> list:
+        """
+        Функция получает теги на целевом языке для каждой группы тегов
+        (по правилу таблицы; для групп, которых нет в таблице, -
+        UNKNOWN_TARGET).
+        Параметры:
+            groups: list - группы тегов (TagTrie.match_rules)
+        """
+        target_lists = self.target_lists
+        return [UNKNOWN_TARGET if rule is None else target_lists[rule]
+                for _, _, rule in groups]
+
+    def align_words(self, source_words: list, source_tags: list,
+                    groups: list, group_targets: list) -> list:
+        """
+        Функция для каждой группы тегов выбирает основы слов входного
+        языка под теги целевого языка (transform_groups).
+        Возвращает список пар (основы слов, теги целевого языка) по группам.
+        Параметры:
+            source_words: list - основы слов предложения
+            source_tags: list - теги слов предложения
+            groups: list - группы тегов (TagTrie.match_rules)
+            group_targets: list - теги целевого языка по группам
+        """
+        selected = []
+        for (start, end, rule), tmp_target_list in zip(
+                groups, group_targets):
+            # группируем слова
+            tmp_words_list = ' '.join(source_words[start:end]).split()
+
+            # если основ слов окажется меньше, чем тегов для целевого языка,
+            # добавляем "экстра-слово"
+            while len(tmp_words_list) < len(tmp_target_list):
+                tmp_words_list.append("extra_word")
+
+            # сначала переводим теги
+            # потом из исходных слов выбираем те части речи, которые
+            # соответствуют частям речи в выходных тегах
+            # пример:
+            # you<prn> are<vbser> with<prep> your<det> books<n>
+            # ↓
+            # <prn> <vbser> <prep> <det> <n>
+            # ↓
+            # <prn> <n>
+            # ↓
+            # сен<prn> кітаптарыңмен<n>
+            # если количество основ слов и тегов целевого языка одинаково,
+            # то ничего делать не надо.
+            # а вот если слов больше - то выбираем слова по карте
+            # выравнивания
+            if len(tmp_words_list) != len(tmp_target_list):
+                # для правил таблицы карта выравнивания построена заранее,
+                # для неизвестных групп тегов строим её на месте
+                if rule is None:
+                    alignment = build_alignment(
+                        ' '.join(source_tags[start:end]).split(),
+                        tmp_target_list, self.tag_classes)
+                else:
+                    alignment = self.alignments[rule]
+                tmp_words_list = [tmp_words_list[idx] for idx in alignment]
+
+            selected.append((tmp_words_list, tmp_target_list))
+        return selected
+
+    @staticmethod
+    def render(selected: list, output_lexicon: dict) -> str:
+        """
+        Функция переводит подобранные основы слов и собирает строку
+        перевода за один проход.
+        Параметры:
+            selected: list - пары (основы слов, теги целевого языка) по
+                             группам (select_words)
+            output_lexicon: dict - переводы основ слов для вывода
+                                   (build_output_lexicon); основы, которых
+                                   в нем нет, становятся "unknown word"
+        """
+        parts = []
+        for tmp_words_list, tmp_target_list in selected:
+            # переводим слова
+            # (пустые переводы при этом пропадают, как и раньше)
+            tmp_translations = []
+            for word in tmp_words_list:
+                translation = output_lexicon.get(word, UNKNOWN_WORD_OUTPUT)
+                if translation.__class__ is tuple:
+                    tmp_translations.extend(translation)
+                else:
+                    tmp_translations.append(translation)
+
+            if tmp_target_list is UNKNOWN_TARGET:
+                tmp_target_list = UNKNOWN_TARGET_OUTPUT
+
+            # готовим результат для вывода
+            for word, tags in zip(tmp_translations, tmp_target_list):
+                parts.append('^' + word + tags)
+
+        return ' '.join(parts)
+
+    def translate_line(self, line: str) -> str:
+        """
+        Функция переводит одну строку со словами с морфологическими
+        анализами. Возвращает строку перевода (без символа конца строки).
+        Если у переводчика есть кэш, перевод сначала ищется в нем.
+        """
+        cache = self.cache
+        if cache is None:
+            return self.translate_new_line(line)
+        key = cache.key(self.direction, line)
+        output = cache.get(key)
+        if output is None:
+            output = self.translate_new_line(key[1])
+            cache.put(key, output)
+        return output
+
+    def translate_new_line(self, line: str) -> str:
+        """
+        Функция переводит одну строку, не обращаясь к кэшу.
+        """
+        source_words, source_tags = parse_line(line)
+
+        # определяем группы тегов и их правила в таблице
+        # последовательности тегов ищутся, начиная с самых длинных
+        # поиск идет по введённому предложению слева направо
+        groups = self.tag_trie.match_rules(
+            self.tag_trie.vocab.encode(source_tags))
+
+        selected = self.select_words(source_words, source_tags, groups)
+        return self.render(selected, self.output_lexicon)
+
+    def translate_lines(self, lines):
+        """
+        Функция-генератор: переводит строки по одной и возвращает переводы
+        в том же порядке (без символов конца строки).
+        """
+        for line in lines:
+            yield self.translate_line(line)
+
+    def translate_batch(self, lines: list) -> list:
+        """
+        Функция переводит сразу много строк. Каждый этап (разбор строк,
+        поиск групп тегов, подбор и перевод слов) выполняется для всех
+        строк пачки подряд; одинаковые строки внутри пачки переводятся один
+        раз, а если у переводчика есть кэш - строки, уже переведенные
+        раньше, берутся из него.
+        Возвращает список переводов в том же порядке (без символов конца
+        строки).
+        Параметры:
+            lines: list - строки со словами с морфологическими анализами
+        """
+        cache = self.cache
+        if cache is None:
+            # различные строки пачки (в порядке первого появления)
+            unique_lines = list(dict.fromkeys(lines))
+            outputs = dict(zip(unique_lines,
+                               self.translate_unique(unique_lines)))
+            return [outputs[line] for line in lines]
+
+        direction = self.direction
+        keys = [cache.key(direction, line) for line in lines]
+        outputs = {}
+        new_keys = []
+        for key in dict.fromkeys(keys):
+            output = cache.get(key)
+            if output is None:
+                new_keys.append(key)
+            else:
+                outputs[key] = output
+        new_outputs = self.translate_unique([key[1] for key in new_keys])
+        for key, output in zip(new_keys, new_outputs):
+            cache.put(key, output)
+            outputs[key] = output
+        return [outputs[key] for key in keys]
+
+    def translate_unique(self, lines: list) -> list:
+        """
+        Функция переводит пачку различных строк, не обращаясь к кэшу.
+        Возвращает список переводов в том же порядке.
+        """
+        # разбираем строки
+        parsed = [parse_line(line) for line in lines]
+
+        # ищем группы тегов
+        encode = self.tag_trie.vocab.encode
+        match_rules = self.tag_trie.match_rules
+        groups = [match_rules(encode(source_tags))
+                  for _, source_tags in parsed]
+
+        # подбираем слова под теги целевого языка, переводим их и собираем
+        # строки перевода
+        select_words = self.select_words
+        render = self.render
+        output_lexicon = self.output_lexicon
+        return [render(select_words(source_words, source_tags, line_groups),
+                       output_lexicon)
+                for (source_words, source_tags), line_groups in
+                zip(parsed, groups)]
+
+    def translate_block(self, block: str) -> str:
+        """
+        Функция переводит блок текста из нескольких строк (режим
+        null-flush). Каждая строка блока переводится как отдельная строка
+        входа; если блок заканчивался символом конца строки, перевод тоже
+        заканчивается им.
+        """
+        lines = block.split('\n')
+        # после последнего '\n' строки нет
+        tail = lines.pop() if len(lines) > 1 and not lines[-1] else None
+        outputs = self.translate_batch(lines)
+        if tail is not None:
+            outputs.append(tail)
+        return '\n'.join(outputs)
+
+
+class ProfilingTranslator(Translator):
+    """
+    Переводчик, который замеряет время каждого этапа перевода и считает
+    слова, группы и неизвестные теги и слова (см. stage_stats.py).
+    Переводы те же, что у Translator.
+    Параметры:
+        direction: str - направление перевода
+        cache: SentenceCache - кэш переводов предложений (None - без кэша)
+        stats: StageStats - куда записывать замеры (None - новый объект)
+    """
+
+    def __init__(self, direction: str, cache: SentenceCache = None,
+                 stats: StageStats = None):
+        super().__init__(direction, cache)
+        self.stats = stats if stats is not None else StageStats()
+
+    def translate_new_line(self, line: str) -> str:
+        """
+        Функция переводит одну строку, не обращаясь к кэшу, и замеряет
+        время этапов перевода.
+        """
+        times = self.stats.times
+        clock = time.perf_counter
+
+        start = clock()
+        source_words, source_tags = parse_line(line)
+        tokenized = clock()
+        groups = self.tag_trie.match_rules(
+            self.tag_trie.vocab.encode(source_tags))
+        segmented = clock()
+        group_targets = self.transform_groups(groups)
+        transformed = clock()
+        selected = self.align_words(source_words, source_tags, groups,
+                                    group_targets)
+        aligned = clock()
+        output = self.render(selected, self.output_lexicon)
+        translated = clock()
+
+        times["tokenize"] += tokenized - start
+        times["segment"] += segmented - tokenized
+        times["struct_transform"] += transformed - segmented
+        times["alignment"] += aligned - transformed
+        times["translate"] += translated - aligned
+        self.count(source_words, groups, group_targets, selected)
+        return output
+
+    def translate_unique(self, lines: list) -> list:
+        """
+        Функция переводит пачку различных строк по одной, замеряя время
+        этапов (см. translate_new_line).
+        """
+        return [self.translate_new_line(line) for line in lines]
+
+    def count(self, source_words: list, groups: list, group_targets: list,
+              selected: list):
+        """
+        Функция обновляет счетчики по результатам перевода одной строки.
+        """
+        counts = self.stats.counts
+        counts["lines"] += 1
+        counts["tokens"] += len(source_words)
+        counts["groups"] += len(groups)
+        for (start, end, _), tmp_target_list in zip(groups, group_targets):
+            if tmp_target_list is UNKNOWN_TARGET:
+                counts["unknown_tags"] += 1
+            # столько "экстра-слов" добавил align_words
+            words_count = len(' '.join(source_words[start:end]).split())
+            if words_count < len(tmp_target_list):
+                counts["extra_word"] += len(tmp_target_list) - words_count
+        output_lexicon = self.output_lexicon
+        for tmp_words_list, _ in selected:
+            for word in tmp_words_list:
+                if word not in output_lexicon:
+                    counts["unknown_word"] += 1
 
 # ==========
 # code
 # ==========
 
 
-# определяем направление перевода
-cur_direction = "eng-kaz"
-# cur_direction = "kaz-eng"
-# cur_direction = "rus-kaz"
-# cur_direction = "kaz-rus"
-
-if cur_direction == "eng-kaz":
-    source_table = eng_tags_4_eng_kaz
-    target_table = kaz_tags_4_eng_kaz
-elif cur_direction == "kaz-eng":
-    source_table = kaz_tags_4_eng_kaz
-    target_table = eng_tags_4_eng_kaz
-elif cur_direction == "rus-kaz":
-    source_table = rus_tags_4_kaz_rus
-    target_table = kaz_tags_4_kaz_rus
-elif cur_direction == "kaz-rus":
-    source_table = kaz_tags_4_kaz_rus
-    target_table = rus_tags_4_kaz_rus
-# если направление перевода задано неверно, выбросить exception
-else:
-    raise ValueError("Неправильно задано направление перевода")
-
-# test = [
-    # "^Later<adv>$^,<cm>$ ^when<adv><itg>$ ^he<prn><subj><p3><m><sg>$ ^have<vblex><past>$ ^honed<adj>$ ^his<det><pos><sp>$ ^skill<n><pl>$^,<cm>$ ^he<prn><subj><p3><m><sg>$ ^become<vblex><past>$ ^a<det><ind><sg>$ ^"<sent>$^road<n><sg>$ ^*gambler$^"<sent>$^,<cm>$ ^a<det><ind><sg>$ ^travel<vblex><subs>$ ^*hustler$ ^who<prn><itg><m><sp>$ ^become<vblex><past>$ ^a<det><ind><sg>$ ^underground<adj>$ ^legend<n><sg>$ ^by<pr>$ ^win<vblex><ger>$ ^at<pr>$ ^all<adj>$ ^manner<n><sg>$ ^of<pr>$ ^proposition<n><pl>$^,<cm>$ ^many<prn><tn><mf><pl>$ ^of<pr>$ ^they<prn><obj><p3><mf><pl>$ ^tricky<adj><sint>$ ^if<cnjadv>$ ^not<adv>$ ^outright<adv>$ ^fraudulent<adj>$^.<sent>$ ^Among<pr>$ ^his<det><pos><sp>$ ^favourite<n><pl>$ ^be<vbser><past>$^:<sent>$ ^bet<vblex><ger>$ ^he<prn><subj><p3><m><sg>$ ^can<vaux><past>$ ^throw<vblex><inf>$ ^a<det><ind><sg>$ ^Walnut<n><sg>$ ^over<pr>$ ^a<det><ind><sg>$ ^building<n><sg>$ ^(<lpar>$^he<prn><subj><p3><m><sg>$ ^have<vbhaver><past>$ ^*weighted$ ^the<det><def><sp>$ ^hollowed<adj>$ ^shell<n><sg>$ ^with<pr>$ ^lead<vblex><pres>$ ^beforehand<adv>$^)<rpar>$^,<cm>$ ^throw<vblex><ger>$ ^a<det><ind><sg>$ ^large<adj><sint>$ ^room<n><sg>$ ^key<n><sg>$ ^into<pr>$ ^its<det><pos><sp>$ ^lock<n><sg>$^,<cm>$ ^and<cnjcoo>$ ^move<vblex><ger>$ ^a<det><ind><sg>$ ^road<n><sg>$ ^*mileage$ ^sign<vblex><pres>$ ^before<adv>$ ^bet<vblex><ger>$ ^that<prn><tn><mf><sg>$ ^the<det><def><sp>$ ^list<vblex><pp>$ ^distance<n><sg>$ ^to<pr>$ ^the<det><def><sp>$ ^town<n><sg>$ ^be<vbser><past><p3><sg>$ ^in<pr>$ ^error<n><sg>$^.<sent>$ ^He<prn><subj><p3><m><sg>$ ^once<adv>$ ^bet<vblex><pp>$ ^that<cnjsub>$ ^he<prn><subj><p3><m><sg>$ ^can<vaux><past>$ ^drive<vblex><inf>$ ^a<det><ind><sg>$ ^golf<n><sg>$ ^ball<n><sg>$ ^500<num>$ ^yard<n><pl>$^,<cm>$ ^use<vblex><ger>$ ^a<det><ind><sg>$ ^*hickory$^-<guio>$^*shafted$ ^club<n><sg>$^,<cm>$ ^at<pr>$ ^a<det><ind><sg>$ ^time<n><sg>$ ^when<adv><itg>$ ^a<det><ind><sg>$ ^expert<n><sg>$ ^player<n><sg>$ ^'s<gen>$ ^drive<vblex><inf>$ ^be<vbser><past><p3><sg>$ ^just<adv>$ ^over<pr>$ ^200<num>$ ^yard<n><pl>$^.<sent>$ ^He<prn><subj><p3><m><sg>$ ^win<vblex><past>$ ^by<pr>$ ^wait<vblex><ger>$ ^until<pr>$ ^winter<n><sg>$ ^and<cnjcoo>$ ^drive<vblex><ger>$ ^the<det><def><sp>$ ^ball<n><sg>$ ^onto<pr>$ ^a<det><ind><sg>$ ^freeze<vblex><pp>$ ^lake<n><sg>$^,<cm>$ ^where<adv><itg>$ ^it<prn><subj><p3><nt><sg>$ ^bounce<vblex><past>$ ^past<vblex><inf>$ ^the<det><def><sp>$ ^require<vblex><pp>$ ^distance<n><sg>$ ^on<pr>$ ^the<det><def><sp>$ ^ice<n><sg>$^.<sent>$"
+def translate_in_batches(translator: Translator, lines, batch_size: int):
+    """
+    Функция-генератор: читает строки пачками по batch_size и переводит
+    каждую пачку через translate_batch. Переводы возвращаются в том же
+    порядке, что и строки.
+    """
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            break
+        yield from translator.translate_batch(batch)
+
+
+# переводчик процесса-обработчика в параллельном режиме
+# при запуске процессов через fork он наследуется от родителя вместе с
+# таблицами и словарем (страницы памяти общие, пока их не изменят)
+worker_translator = None
+
+
+def init_worker(direction: str, layout: str = None):
+    """
+    Функция создает переводчик в процессе-обработчике, если процессы
+    запускаются не через fork и не могут унаследовать его от родителя.
+    Параметры:
+        direction: str - направление перевода
+        layout: str - раскладка файла, отображенного в память, из которого
+                      брать словарь и таблицы (use_mapped_lexicon), или
+                      None
+    """
+    global worker_translator
+    if layout:
+        use_mapped_lexicon(direction, layout)
+    worker_translator = Translator(direction)
+
+
+def translate_chunk(lines: list) -> list:
+    """
+    Функция переводит пачку строк в процессе-обработчике.
+    """
+    return worker_translator.translate_batch(lines)
+
+
+def translate_parallel(translator: Translator, lines, jobs: int,
+                       chunk_size: int = PARALLEL_CHUNK_SIZE):
+    """
+    Функция-генератор: переводит строки в jobs процессах, отдавая им пачки
+    по chunk_size строк. Переводы возвращаются в том же порядке, что и
+    строки. Одновременно в работе не больше jobs * 4 пачек, поэтому вход
+    не читается в память целиком.
+    """
+    global worker_translator
+    worker_translator = translator
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        initializer, initargs = None, ()
+        # переносим уже созданные объекты (таблицы, словарь) в постоянное
+        # поколение сборщика мусора, чтобы он не трогал их страницы в
+        # процессах-обработчиках (после закрытия процессов они
+        # возвращаются обратно)
+        gc.freeze()
+        frozen = True
+    else:
+        context = multiprocessing.get_context()
+        mapped = mapped_lexicons.get(translator.direction)
+        initializer, initargs = init_worker, (
+            translator.direction, mapped and mapped.layout)
+        frozen = False
+
+    lines = iter(lines)
+    try:
+        with context.Pool(jobs, initializer, initargs) as pool:
+            pending = deque()
+            while True:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(translate_chunk, (chunk,)))
+                if len(pending) >= jobs * 4:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+    finally:
+        if frozen:
+            gc.unfreeze()
+
+
+def serve_null_flush(translator: Translator, stdin, stdout):
+    """
+    Функция переводит вход в режиме null-flush (как у программ Apertium с
+    ключом -z): каждый блок, заканчивающийся символом '\\0', переводится и
+    выводится сразу, с '\\0' в конце, после чего поток сбрасывается и
+    ожидается следующий блок. Так переводчик может работать постоянно
+    внутри конвейера, не загружая таблицы и словарь для каждого запроса.
+    Параметры:
+        stdin - двоичный поток ввода
+        stdout - двоичный поток вывода
+    """
+    writer = open_output(stdout)
+    for block in read_null_blocks(stdin):
+        writer.write(translator.translate_block(block) + NULL_FLUSH)
+        writer.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Перевод слов с морфологическими анализами по таблицам")
+    # определяем направление перевода
+    parser.add_argument("-d", "--direction", default="eng-kaz",
+                        choices=["eng-kaz", "kaz-eng", "rus-kaz", "kaz-rus"],
+                        help="направление перевода")
+    parser.add_argument("-b", "--batch-size", type=int, default=1,
+                        help="сколько строк переводить за раз "
+                             "(по умолчанию 1 - построчно)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="количество процессов для перевода "
+                             "(по умолчанию 1)")
+    parser.add_argument("--line-flush", action="store_true",
+                        help="выводить перевод сразу после каждой строки "
+                             "(для интерактивной работы); по умолчанию "
+                             "вывод пишется большими блоками")
+    parser.add_argument("-z", "--null-flush", action="store_true",
+                        help="режим null-flush: переводить каждый блок, "
+                             "заканчивающийся символом \\0, и сразу "
+                             "выводить его перевод")
+    parser.add_argument("--cache-entries", type=int,
+                        help="кэшировать переводы предложений: наибольшее "
+                             "число записей кэша")
+    parser.add_argument("--cache-bytes", type=int,
+                        help="кэшировать переводы предложений: наибольший "
+                             "размер кэша в байтах")
+    parser.add_argument("--profile", action="store_true",
+                        help="замерять время этапов перевода и считать "
+                             "слова, группы и неизвестные теги и слова; "
+                             "сводка выводится в stderr при завершении и "
+                             "по сигналу SIGUSR1")
+    parser.add_argument("--mapped-lexicon", nargs="?", const="hash",
+                        choices=sorted(LEXICON_CLASSES),
+                        help="брать словарь и таблицы из файла, "
+                             "отображенного в память (compiled/*.lex), "
+                             "общего для всех процессов переводчика; "
+                             "раскладка: hash (по умолчанию) или sorted "
+                             "(меньше файл, поиск делением пополам)")
+    args = parser.parse_args()
+    if args.profile and args.jobs > 1:
+        parser.error("--profile работает только в одном процессе (-j 1)")
+    if args.null_flush and (args.jobs > 1 or args.batch_size > 1 or
+                            args.line_flush):
+        parser.error("-z нельзя использовать вместе с -j, -b и "
+                     "--line-flush")
+
+    # кэш переводов предложений (счетчики выводятся в stderr в конце)
+    # при -j у каждого процесса-обработчика свой кэш
+    cache = None
+    if args.cache_entries or args.cache_bytes:
+        cache = SentenceCache(args.cache_entries, args.cache_bytes)
+    if args.mapped_lexicon:
+        use_mapped_lexicon(args.direction, args.mapped_lexicon)
+    if args.profile:
+        translator = ProfilingTranslator(args.direction, cache)
+        install_dump(translator.stats)
+    else:
+        translator = Translator(args.direction, cache)
+
+    if args.null_flush:
+        serve_null_flush(translator, sys.stdin.buffer, sys.stdout.buffer)
+        if cache is not None:
+            sys.stderr.write(cache.format_stats())
+        return
+
+    # test = [
+    #     "^Later<adv>$^,<cm>$ ^when<adv><itg>$ ^he<prn><subj><p3><m><sg>$ ^have<vblex><past>$ ^honed<adj>$ ^his<det><pos><sp>$ ^skill<n><pl>$^,<cm>$ ^he<prn><subj><p3><m><sg>$ ^become<vblex><past>$ ^a<det><ind><sg>$ ^"<sent>$^road<n><sg>$ ^*gambler$^"<sent>$^,<cm>$ ^a<det><ind><sg>$ ^travel<vblex><subs>$ ^*hustler$ ^who<prn><itg><m><sp>$ ^become<vblex><past>$ ^a<det><ind><sg>$ ^underground<adj>$ ^legend<n><sg>$ ^by<pr>$ ^win<vblex><ger>$ ^at<pr>$ ^all<adj>$ ^manner<n><sg>$ ^of<pr>$ ^proposition<n><pl>$^,<cm>$ ^many<prn><tn><mf><pl>$ ^of<pr>$ ^they<prn><obj><p3><mf><pl>$ ^tricky<adj><sint>$ ^if<cnjadv>$ ^not<adv>$ ^outright<adv>$ ^fraudulent<adj>$^.<sent>$ ^Among<pr>$ ^his<det><pos><sp>$ ^favourite<n><pl>$ ^be<vbser><past>$^:<sent>$ ^bet<vblex><ger>$ ^he<prn><subj><p3><m><sg>$ ^can<vaux><past>$ ^throw<vblex><inf>$ ^a<det><ind><sg>$ ^Walnut<n><sg>$ ^over<pr>$ ^a<det><ind><sg>$ ^building<n><sg>$ ^(<lpar>$^he<prn><subj><p3><m><sg>$ ^have<vbhaver><past>$ ^*weighted$ ^the<det><def><sp>$ ^hollowed<adj>$ ^shell<n><sg>$ ^with<pr>$ ^lead<vblex><pres>$ ^beforehand<adv>$^)<rpar>$^,<cm>$ ^throw<vblex><ger>$ ^a<det><ind><sg>$ ^large<adj><sint>$ ^room<n><sg>$ ^key<n><sg>$ ^into<pr>$ ^its<det><pos><sp>$ ^lock<n><sg>$^,<cm>$ ^and<cnjcoo>$ ^move<vblex><ger>$ ^a<det><ind><sg>$ ^road<n><sg>$ ^*mileage$ ^sign<vblex><pres>$ ^before<adv>$ ^bet<vblex><ger>$ ^that<prn><tn><mf><sg>$ ^the<det><def><sp>$ ^list<vblex><pp>$ ^distance<n><sg>$ ^to<pr>$ ^the<det><def><sp>$ ^town<n><sg>$ ^be<vbser><past><p3><sg>$ ^in<pr>$ ^error<n><sg>$^.<sent>$ ^He<prn><subj><p3><m><sg>$ ^once<adv>$ ^bet<vblex><pp>$ ^that<cnjsub>$ ^he<prn><subj><p3><m><sg>$ ^can<vaux><past>$ ^drive<vblex><inf>$ ^a<det><ind><sg>$ ^golf<n><sg>$ ^ball<n><sg>$ ^500<num>$ ^yard<n><pl>$^,<cm>$ ^use<vblex><ger>$ ^a<det><ind><sg>$ ^*hickory$^-<guio>$^*shafted$ ^club<n><sg>$^,<cm>$ ^at<pr>$ ^a<det><ind><sg>$ ^time<n><sg>$ ^when<adv><itg>$ ^a<det><ind><sg>$ ^expert<n><sg>$ ^player<n><sg>$ ^'s<gen>$ ^drive<vblex><inf>$ ^be<vbser><past><p3><sg>$ ^just<adv>$ ^over<pr>$ ^200<num>$ ^yard<n><pl>$^.<sent>$ ^He<prn><subj><p3><m><sg>$ ^win<vblex><past>$ ^by<pr>$ ^wait<vblex><ger>$ ^until<pr>$ ^winter<n><sg>$ ^and<cnjcoo>$ ^drive<vblex><ger>$ ^the<det><def><sp>$ ^ball<n><sg>$ ^onto<pr>$ ^a<det><ind><sg>$ ^freeze<vblex><pp>$ ^lake<n><sg>$^,<cm>$ ^where<adv><itg>$ ^it<prn><subj><p3><nt><sg>$ ^bounce<vblex><past>$ ^past<vblex><inf>$ ^the<det><def><sp>$ ^require<vblex><pp>$ ^distance<n><sg>$ ^on<pr>$ ^the<det><def><sp>$ ^ice<n><sg>$^.<sent>$"
     # ]
-# for line in test:
-
-# Переменная для подсчета выводимых строк.
-# Должна была называться count, но что-то пошло не так.
-# co = 0
-# из stdin получеам слова с морфологическими анализами
-for line in sys.stdin:
-    #  Удаление кавычек ' и ". Может быть не нужно... Скорее всего не нужно.
-    if '\'' in line:
-        line = line.replace('\'', '')
-    if '\"' in line:
-        line = line.replace('\"', '')
-    # разбиваем строку по символу '^' (сам он при этом пропадает)
-    splitted_input_str = line.split('^')
-
-    source_words_with_tags = []
-    # убираем из входной строки пустые слова, точки и пробелы
-    for item in splitted_input_str:
-        if item != "" and "sent" not in item:
-            source_words_with_tags.append(item.strip())
-
-    source_words = []
-    source_tags = []
-    # разделяем слова и теги
-    for item in source_words_with_tags:
-        # определяем, индекс символа, с которого начинаются теги
-        if '<' in item:
-            tag_idx = item.index('<')
-        # если тегов нет, не делать ничего
-        else:
-            continue
+    # for line in test:
+
+    # Переменная для подсчета выводимых строк.
+    # Должна была называться count, но что-то пошло не так.
+    # co = 0
+    # из stdin получеам слова с морфологическими анализами
+    # stdin читается большими кусками, вывод пишется большими блоками
+    lines = open_input(sys.stdin.buffer)
+    writer = open_output(sys.stdout.buffer, line_flush=args.line_flush)
+    if args.jobs > 1:
+        chunk_size = args.batch_size
+        if chunk_size <= 1:
+            chunk_size = PARALLEL_CHUNK_SIZE
+        outputs = translate_parallel(translator, lines, args.jobs,
+                                     chunk_size)
+    elif args.batch_size > 1:
+        outputs = translate_in_batches(translator, lines, args.batch_size)
+    else:
+        outputs = translator.translate_lines(lines)
+    for output in outputs:
+        # Это та самая переменная для подсчета выводимых строк, которая
+        # должна была называться count, но что-то пошло не так.
+        # co += 1
+        # writer.write(str(co) + ": " + output + '\n')
+        writer.write(output + '\n')
+    writer.flush()
+    if cache is not None and args.jobs <= 1:
+        sys.stderr.write(cache.format_stats())
+
 
-        source_words.append(item[:tag_idx])
-        source_tags.append(item[tag_idx:])
-
-    # определяем, границы групп тегов
-    tag_borders = []
-    current_tag = 0
-    # последовательности тегов ищутся, начиная с самых длинных
-    # поиск идет по введённому предложению слева направо
-    # ближе к концу предложения длина последовательности тегов уменьшается
-    while current_tag < len(source_tags):
-        found = False
-        # уменьшаем длину последовательности тегов ближе к концу предложения
-        if len(source_tags) - current_tag >= 6:
-            max_len = 6
-        else:
-            max_len = len(source_tags) - current_tag
-        # ищем последовательности тегов, начиная с current_tag
-        # если что-то найдено, current_tag смещается вправо
-        for tags_len in range(max_len, 0, -1):
-            if ' '.join(source_tags[current_tag:current_tag + tags_len]) in \
-                                                                source_table:
-                tag_borders.append(current_tag)
-                current_tag += tags_len
-                found = True
-                break
-        # если ничего не найдено, current_tag грустно вздыхает и смещается
-        # вправо на 1
-        if not found:
-            tag_borders.append(current_tag)
-            current_tag += 1
-    # конец последовательности тегов тоже является границей
-    tag_borders.append(len(source_tags))
-
-    # группируем слова, исходные теги и целевые теги в одну структуру
-    # namedtupple в python - аналог struct
-    # words - source tags - target tags
-    w_s_t = namedtuple(typename="w_s_t",
-                       field_names=["words", "source_tags", "target_tags"])
-
-    w_s_t_list = []
-    for i in range(len(tag_borders) - 1):
-        # группируем слова
-        tmp_words = ' '.join(source_words[tag_borders[i]:tag_borders[i + 1]])
-        # группируем теги на исходном языке
-        tmp_source = ' '.join(source_tags[tag_borders[i]:tag_borders[i + 1]])
-        # получаем теги на целевом языке
-        tmp_target = table_struct_transform(direction=cur_direction,
-                                            source_morph=tmp_source)
-
-        # если основ слов окажется меньше, чем тегов для целевого языка,
-        # добавляем "экстра-слово"
-        while len(tmp_words.split()) < len(tmp_target.split()):
-            tmp_words += " extra_word"
-
-        # объединяем сгруппированное в одну структуру и добавляем её в массив
-        tmp_struct = w_s_t(words=tmp_words, source_tags=tmp_source,
-                           target_tags=tmp_target)
-        w_s_t_list.append(tmp_struct)
-
-    # сначала переводим теги
-    # потом из исходных слов выбираем те части речи, которые соответствуют
-    # частям речи в выходных тегах
-    # пример:
-    # you<prn> are<vbser> with<prep> your<det> books<n>
-    # ↓
-    # <prn> <vbser> <prep> <det> <n>
-    # ↓
-    # <prn> <n>
-    # ↓
-    # сен<prn> кітаптарыңмен<n>
-    for i in range(len(w_s_t_list)):
-        tmp_words_list = w_s_t_list[i].words.split()
-        tmp_target_list = w_s_t_list[i].target_tags.split()
-        # если количество основ слов и тегов целевого языка одинаково,
-        # то ничего делать не надо.
-        # а вот если слов больше - то надо делать то, что написано ниже
-        # ситуация, если слов меньше, решается выше добавлением "экстра-слова"
-        if len(tmp_words_list) != len(tmp_target_list):
-            tmp_source_list = w_s_t_list[i].source_tags.split()
-            tmp_new_words_list = []
-
-            for tar_tags in tmp_target_list:
-                for sour_tags in tmp_source_list:
-                    if compare_tags(get_first_tag(tar_tags),
-                                    get_first_tag(sour_tags)):
-                        idx = tmp_source_list.index(sour_tags)
-                        tmp_new_words_list.append(tmp_words_list[idx])
-                        break
-
-            # кортежи в питоне немутабельны, поэтому просто изменить одно
-            # поле невозможно. надо переписывать/пересоздавать и заменять
-            # всю структуру/кортеж
-            w_s_t_list[i] = \
-                w_s_t_list[i]._replace(words=' '.join(tmp_new_words_list))
-
-    # переводим слова
-    for i in range(len(w_s_t_list)):
-        tmp_words_list = w_s_t_list[i].words.split()
-        tmp_translations = []
-        for word in tmp_words_list:
-            tmp_tran = table_translate(direction=cur_direction,
-                                       source_word=word)
-            tmp_translations.append(tmp_tran)
-
-        w_s_t_list[i] = \
-            w_s_t_list[i]._replace(words=' '.join(tmp_translations))
-
-    # готовим результат для вывода
-    output = ""
-    for item in w_s_t_list:
-        tmp_words_list = item.words.split()
-        tmp_target_list = item.target_tags.split()
-        for i in range(len(tmp_words_list)):
-            output += '^'
-            output += tmp_words_list[i]
-            output += tmp_target_list[i]
-            output += ' '
-
-    # убираем последний пробел, потому что некрасиво
-    output = output.rstrip()
-    # если имеются '_', заменяем их на пробелы
-    if '_' in output:
-        output = output.replace('_', ' ')
-    output += '\n'
-
-    # Это та самая переменная для подсчета выводимых строк, которая
-    # должна была называться count, но что-то пошло не так.
-    # co += 1
-    # sys.stdout.write(str(co) + ": " + output)
-    sys.stdout.write(output)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# Классы эквивалентности тегов для выравнивания слов:
+# направление перевода -> список классов
+# Слово входного языка подходит под тег целевого языка, если их первые
+# теги входят в один класс (см. rule_index.TagClasses). Тег, которого нет
+# ни в одном классе, равен только самому себе.
+# Чтобы добавить новую эквивалентность, достаточно дописать класс в список
+# нужного направления, например:
+#     ["<vbser>", "<cop>"],
+
+# глаголы
+# <vblex> - <v>
+# <vbmod> - <v>
+# <vbhaver> - <v>
+VERB_TAGS = ["<v>", "<vblex>", "<vbmod>", "<vbhaver>"]
+
+TAG_CLASSES = {
+    "eng-kaz": [
+        VERB_TAGS,
+    ],
+    "kaz-eng": [
+        VERB_TAGS,
+    ],
+    "rus-kaz": [
+        VERB_TAGS,
+    ],
+    "kaz-rus": [
+        VERB_TAGS,
+    ],
+}
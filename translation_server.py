@@ -0,0 +1,584 @@
+# Сервер перевода
+
+# Таблицы и словари направлений перевода загружаются один раз, после чего
+# сервер отвечает на запросы перевода:
+# - через Unix-сокет (--socket) в режиме null-flush, как
+#   struct_rules_via_table.py -z: клиент присылает блок текста,
+#   заканчивающийся символом '\0', и получает перевод с '\0' в конце;
+#   используется направление по умолчанию (первое из -d);
+# - по HTTP на localhost (--port):
+#   POST /translate?direction=eng-kaz  (в теле - строки для перевода)
+#   GET  /translate?direction=eng-kaz&q=^text<n><sg>$
+#   GET  /stats  (количество запросов и гистограмма задержек в JSON)
+
+# Запросы, пришедшие одновременно, переводятся одной пачкой
+# (Translator.translate_batch), количество одновременно обрабатываемых
+# запросов ограничено (--max-concurrency). Задержка каждого запроса
+# попадает в гистограмму, которая выводится в stderr при остановке.
+
+# запуск:
+# python translation_server.py --socket /tmp/struct_rules.sock --port 8765
+
+# ==========
+# imports
+# ==========
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from apertium_stream import NULL_FLUSH
+from sentence_cache import SentenceCache
+from stage_stats import StageStats, install_dump
+from mapped_lexicon import LEXICON_CLASSES
+from struct_rules_via_table import (DIRECTIONS, ProfilingTranslator,
+                                    Translator, use_mapped_lexicon)
+
+# ==========
+# constants
+# ==========
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# сколько запросов обрабатывается одновременно
+MAX_CONCURRENCY = 64
+# сколько строк переводится одной пачкой
+MAX_BATCH_SIZE = 256
+# наибольший размер запроса (блока null-flush или тела HTTP) в байтах
+MAX_REQUEST_SIZE = 16 << 20
+
+# верхние границы интервалов гистограммы задержек в секундах
+# (последний интервал - всё, что больше последней границы)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+# ==========
+# classes
+# ==========
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек запросов.
+    Параметры:
+        buckets: tuple - верхние границы интервалов в секундах
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        """
+        Функция добавляет задержку одного запроса.
+        """
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Функция оценивает q-й процентиль задержки (0 < q <= 100): возвращает
+        верхнюю границу интервала, в который он попадает (inf - если он
+        больше последней границы, 0.0 - если запросов не было).
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if bucket < len(self.buckets):
+            return self.buckets[bucket]
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        """
+        Функция возвращает гистограмму в виде словаря (для /stats).
+        """
+        bounds = [str(bound) for bound in self.buckets] + ["inf"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(bounds, self.counts)),
+        }
+
+    def format(self) -> str:
+        """
+        Функция возвращает гистограмму в виде текста.
+        """
+        lines = ["запросов: %d, p50 <= %s мс, p90 <= %s мс, p99 <= %s мс" %
+                 (self.count, format_ms(self.percentile(50)),
+                  format_ms(self.percentile(90)),
+                  format_ms(self.percentile(99)))]
+        for bound, count in zip(self.buckets + (float("inf"),),
+                                self.counts):
+            if count:
+                lines.append("  <= %8s мс: %d" % (format_ms(bound), count))
+        return '\n'.join(lines) + '\n'
+
+
+class BatchingTranslator:
+    """
+    Перевод строк из одновременных запросов пачками.
+    Запросы, пришедшие за один шаг цикла событий, собираются вместе и
+    переводятся одним вызовом translate_batch (но не больше
+    max_batch_size строк за раз, чтобы долгая пачка не задерживала
+    остальные запросы). Если перевод пачки завершился ошибкой, запросы
+    пачки переводятся заново по одному, и ошибку получает только тот
+    запрос, на котором она возникла.
+    Параметры:
+        translator: Translator - переводчик направления
+        max_batch_size: int - сколько строк переводить одной пачкой
+    """
+
+    def __init__(self, translator: Translator,
+                 max_batch_size: int = MAX_BATCH_SIZE):
+        self.translator = translator
+        self.max_batch_size = max_batch_size
+        # ожидающие запросы: (строки, future)
+        self.pending = deque()
+        self.scheduled = False
+        self.batches = 0
+
+    async def translate(self, lines: list) -> list:
+        """
+        Функция переводит строки одного запроса вместе со строками других
+        запросов. Возвращает список переводов.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((lines, future))
+        if not self.scheduled:
+            self.scheduled = True
+            loop.call_soon(self.flush)
+        return await future
+
+    def flush(self):
+        """
+        Функция переводит одну пачку ожидающих запросов.
+        """
+        batch = []
+        requests = []
+        while self.pending and (not batch or
+                                len(batch) + len(self.pending[0][0]) <=
+                                self.max_batch_size):
+            lines, future = self.pending.popleft()
+            requests.append((len(batch), len(lines), future))
+            batch.extend(lines)
+
+        try:
+            outputs = self.translator.translate_batch(batch)
+        except Exception as error:
+            if len(requests) == 1:
+                set_outcome(requests[0][2], error=error)
+            else:
+                self.retry_each(batch, requests)
+        else:
+            for start, count, future in requests:
+                set_outcome(future, outputs[start:start + count])
+        self.batches += 1
+
+        if self.pending:
+            asyncio.get_running_loop().call_soon(self.flush)
+        else:
+            self.scheduled = False
+
+    def retry_each(self, batch: list, requests: list):
+        """
+        Функция переводит запросы пачки по одному (после ошибки перевода
+        всей пачки).
+        Параметры:
+            batch: list - строки всех запросов пачки
+            requests: list - запросы: (начало строк в пачке, количество
+                             строк, future)
+        """
+        for start, count, future in requests:
+            if future.done():
+                continue
+            try:
+                outputs = self.translator.translate_batch(
+                    batch[start:start + count])
+            except Exception as error:
+                set_outcome(future, error=error)
+            else:
+                set_outcome(future, outputs)
+
+
+class TranslationServer:
+    """
+    Сервер перевода: держит загруженные переводчики направлений и
+    обрабатывает запросы через Unix-сокет и HTTP.
+    Параметры:
+        directions: list - направления перевода (первое - по умолчанию)
+        max_concurrency: int - сколько запросов обрабатывается одновременно
+        max_batch_size: int - сколько строк переводится одной пачкой
+        cache: SentenceCache - общий кэш переводов предложений всех
+                               направлений (None - без кэша)
+        stage_stats: StageStats - общие замеры этапов перевода всех
+                                  направлений (None - без замеров)
+    """
+
+    def __init__(self, directions: list,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 cache: SentenceCache = None,
+                 stage_stats: StageStats = None):
+        self.default_direction = directions[0]
+        self.cache = cache
+        self.stage_stats = stage_stats
+        self.translators = {}
+        for direction in directions:
+            if stage_stats is None:
+                translator = Translator(direction, cache)
+            else:
+                translator = ProfilingTranslator(direction, cache,
+                                                 stage_stats)
+            self.translators[direction] = BatchingTranslator(
+                translator, max_batch_size)
+        self.limit = asyncio.Semaphore(max_concurrency)
+        self.histogram = LatencyHistogram()
+
+    async def translate(self, direction: str, text: str) -> str:
+        """
+        Функция переводит текст из одной или нескольких строк (как
+        Translator.translate_block) и учитывает задержку в гистограмме
+        (вместе с ожиданием очереди запросов --max-concurrency).
+        """
+        start = time.perf_counter()
+        async with self.limit:
+            lines = text.split('\n')
+            # после последнего '\n' строки нет
+            newline = len(lines) > 1 and not lines[-1]
+            if newline:
+                lines.pop()
+            outputs = await self.translators[direction].translate(lines)
+            self.histogram.observe(time.perf_counter() - start)
+        return '\n'.join(outputs) + ('\n' if newline else '')
+
+    def stats(self) -> dict:
+        """
+        Функция возвращает статистику сервера (для /stats).
+        """
+        stats = {
+            "directions": list(self.translators),
+            "batches": {direction: batcher.batches
+                        for direction, batcher in self.translators.items()},
+            "latency": self.histogram.as_dict(),
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.stage_stats is not None:
+            stats["stages"] = self.stage_stats.as_dict()
+        return stats
+
+    async def handle_null_flush(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        """
+        Функция обслуживает одно подключение к Unix-сокету: переводит
+        блоки, заканчивающиеся '\\0', пока клиент не закроет подключение.
+        """
+        try:
+            while True:
+                try:
+                    block = await reader.readuntil(b"\0")
+                    block = block[:-1]
+                except asyncio.IncompleteReadError as error:
+                    # текст после последнего '\0' тоже считается блоком
+                    block = error.partial
+                    if not block:
+                        break
+                text = decode_request(block)
+                output = await self.translate(self.default_direction, text)
+                writer.write((output + NULL_FLUSH).encode("utf-8"))
+                await writer.drain()
+        except (asyncio.LimitOverrunError, ConnectionError, ValueError) \
+                as error:
+            sys.stderr.write("null-flush: %s\n" % error)
+        except Exception as error:
+            sys.stderr.write("null-flush: %r\n" % error)
+        finally:
+            writer.close()
+
+    async def handle_http(self, reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter):
+        """
+        Функция обслуживает одно HTTP-подключение (с keep-alive).
+        """
+        try:
+            while True:
+                request = await read_http_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                status, content_type, content = await self.route(
+                    method, target, body)
+                write_http_response(writer, status, content_type, content,
+                                    keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError):
+            pass
+        except ValueError as error:
+            write_http_response(writer, 400, "text/plain",
+                                str(error).encode("utf-8"), False)
+        except Exception as error:
+            sys.stderr.write("http: %r\n" % error)
+            write_http_response(writer, 500, "text/plain",
+                                b"internal server error\n", False)
+        finally:
+            writer.close()
+
+    async def route(self, method: str, target: str, body: bytes) -> tuple:
+        """
+        Функция обрабатывает HTTP-запрос.
+        Возвращает (код ответа, тип содержимого, тело ответа).
+        """
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == "/stats":
+            return 200, "application/json", json.dumps(
+                self.stats(), ensure_ascii=False).encode("utf-8")
+        if url.path != "/translate":
+            return 404, "text/plain", b"not found\n"
+
+        direction = query.get("direction", [self.default_direction])[0]
+        if direction not in self.translators:
+            return 400, "text/plain", (
+                "direction not served: %s\n" % direction).encode("utf-8")
+        if method == "POST":
+            text = decode_request(body)
+        elif method == "GET":
+            text = query.get("q", [""])[0]
+        else:
+            return 405, "text/plain", b"method not allowed\n"
+
+        try:
+            output = await self.translate(direction, text)
+        except Exception as error:
+            # ошибка перевода одного запроса не закрывает подключение
+            sys.stderr.write("translate: %r\n" % error)
+            return 500, "text/plain", b"internal server error\n"
+        return 200, "text/plain; charset=utf-8", output.encode("utf-8")
+
+# ==========
+# functions
+# ==========
+
+
+def format_ms(seconds: float) -> str:
+    """
+    Функция переводит секунды в миллисекунды для вывода.
+    """
+    return "%g" % (seconds * 1000)
+
+
+def set_outcome(future: asyncio.Future, result=None,
+                error: Exception = None):
+    """
+    Функция передает запросу перевод или ошибку (если клиент еще ждет
+    ответа: он мог отключиться, не дождавшись его).
+    """
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def decode_request(data: bytes) -> str:
+    """
+    Функция декодирует запрос из UTF-8. Переводы строк не перекодируются
+    (как в apertium_stream.open_input): '\\r' перед \\n убирается при
+    разборе строки.
+    """
+    return data.decode("utf-8")
+
+
+async def read_http_request(reader: asyncio.StreamReader):
+    """
+    Функция читает один HTTP-запрос.
+    Возвращает (метод, адрес, заголовки, тело, keep-alive) или None, если
+    клиент закрыл подключение.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ValueError("bad request line")
+    method, target, version = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_REQUEST_SIZE:
+        raise ValueError("request too large")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        keep_alive = connection == "keep-alive"
+    else:
+        keep_alive = connection != "close"
+    return method, target, headers, body, keep_alive
+
+
+def write_http_response(writer: asyncio.StreamWriter, status: int,
+                        content_type: str, content: bytes, keep_alive: bool):
+    """
+    Функция записывает HTTP-ответ.
+    """
+    header = ("HTTP/1.1 %d %s\r\n"
+              "Content-Type: %s\r\n"
+              "Content-Length: %d\r\n"
+              "Connection: %s\r\n\r\n" %
+              (status, HTTP_REASONS.get(status, ""), content_type,
+               len(content), "keep-alive" if keep_alive else "close"))
+    writer.write(header.encode("latin-1") + content)
+
+
+async def serve(directions: list, socket_path: str, host: str, port: int,
+                max_concurrency: int, max_batch_size: int,
+                cache: SentenceCache = None, stage_stats: StageStats = None):
+    """
+    Функция запускает сервер и работает, пока не получит SIGINT или
+    SIGTERM. При остановке выводит гистограмму задержек (и счетчики кэша)
+    в stderr.
+    """
+    server = TranslationServer(directions, max_concurrency, max_batch_size,
+                               cache, stage_stats)
+    servers = []
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        servers.append(await asyncio.start_unix_server(
+            server.handle_null_flush, socket_path, limit=MAX_REQUEST_SIZE))
+        sys.stderr.write("null-flush: %s\n" % socket_path)
+    if port:
+        servers.append(await asyncio.start_server(
+            server.handle_http, host, port, limit=MAX_REQUEST_SIZE))
+        sys.stderr.write("http: http://%s:%d/translate\n" % (host, port))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for listener in servers:
+            listener.close()
+            await listener.wait_closed()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        sys.stderr.write(server.histogram.format())
+        if cache is not None:
+            sys.stderr.write(cache.format_stats())
+
+# ==========
+# code
+# ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Сервер перевода слов с морфологическими анализами")
+    parser.add_argument("-d", "--direction", action="append",
+                        choices=list(DIRECTIONS),
+                        help="направление перевода (можно указать "
+                             "несколько; первое - по умолчанию; по "
+                             "умолчанию - все)")
+    parser.add_argument("--socket",
+                        help="путь к Unix-сокету (режим null-flush)")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="адрес HTTP (по умолчанию %s)" % DEFAULT_HOST)
+    parser.add_argument("--port", type=int,
+                        help="порт HTTP (по умолчанию %d, если не задан "
+                             "--socket; 0 - без HTTP)" % DEFAULT_PORT)
+    parser.add_argument("--max-concurrency", type=int,
+                        default=MAX_CONCURRENCY,
+                        help="сколько запросов обрабатывать одновременно "
+                             "(по умолчанию %d)" % MAX_CONCURRENCY)
+    parser.add_argument("-b", "--batch-size", type=int,
+                        default=MAX_BATCH_SIZE,
+                        help="сколько строк переводить одной пачкой "
+                             "(по умолчанию %d)" % MAX_BATCH_SIZE)
+    parser.add_argument("--cache-entries", type=int,
+                        help="кэшировать переводы предложений: наибольшее "
+                             "число записей кэша")
+    parser.add_argument("--cache-bytes", type=int,
+                        help="кэшировать переводы предложений: наибольший "
+                             "размер кэша в байтах")
+    parser.add_argument("--profile", action="store_true",
+                        help="замерять время этапов перевода и считать "
+                             "слова, группы и неизвестные теги и слова; "
+                             "сводка выводится в stderr при завершении, "
+                             "по сигналу SIGUSR1 и в /stats")
+    parser.add_argument("--mapped-lexicon", nargs="?", const="hash",
+                        choices=sorted(LEXICON_CLASSES),
+                        help="брать словари и таблицы из файлов, "
+                             "отображенных в память (compiled/*.lex), "
+                             "общих для всех процессов на машине; "
+                             "раскладка: hash (по умолчанию) или sorted")
+    args = parser.parse_args()
+
+    directions = args.direction or list(DIRECTIONS)
+    port = args.port
+    if port is None:
+        port = 0 if args.socket else DEFAULT_PORT
+    if not args.socket and not port:
+        parser.error("нужно задать --socket или --port")
+
+    cache = None
+    if args.cache_entries or args.cache_bytes:
+        cache = SentenceCache(args.cache_entries, args.cache_bytes)
+
+    if args.mapped_lexicon:
+        for direction in directions:
+            use_mapped_lexicon(direction, args.mapped_lexicon)
+
+    stage_stats = None
+    if args.profile:
+        stage_stats = StageStats()
+        install_dump(stage_stats)
+
+    asyncio.run(serve(directions, args.socket, args.host, port,
+                      args.max_concurrency, args.batch_size, cache,
+                      stage_stats))
+
+
+if __name__ == "__main__":
+    main()